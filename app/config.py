@@ -2,8 +2,35 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
+# Logging, "json" (one object per line) or "text". LOG_SAMPLING keeps a fraction
+# of the INFO lines of the listed loggers, e.g. "images.access=0.1,http.access=0.5"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records waiting to be written, more are dropped
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "images.access=0.1")
+
 # MongoDB Settings
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "imgbest")
+# Connection pool of each client, every process has its own
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))  # waiting for a free connection
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+# Cache of the authenticated user behind each request, "memory" (per process) or
+# "redis" (shared by every worker and node). A TTL of 0 turns it off
+PRINCIPAL_CACHE_BACKEND = os.getenv("PRINCIPAL_CACHE_BACKEND", "memory")
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Migrations, run at startup unless they are left to `python -m app.migrate`
+MIGRATIONS_ON_STARTUP = os.getenv("MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+MIGRATION_LOCK_SECONDS = int(os.getenv("MIGRATION_LOCK_SECONDS", "300"))  # lease, renewed after every batch
 
 # Allowed origins for CORS
 ALLOWED_ORIGINS = os.getenv("FRONTEND_URL")
@@ -13,6 +40,84 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+# Password hashing, stored hashes with another cost are upgraded at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))  # waiting hashes before answering 429
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))  # seconds
+
 # Formats and size validations
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
\ No newline at end of file
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+
+# Storage of originals and processed images: "local", "memory" (tests) or "s3"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "uploads")
+STORAGE_SPOOL_DIR = os.getenv("STORAGE_SPOOL_DIR", os.path.join("uploads", "tmp"))  # uploads are validated here first
+S3_BUCKET = os.getenv("S3_BUCKET", "imgbest")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. MinIO
+S3_REGION = os.getenv("S3_REGION")
+
+# Image processing executor
+PROCESSING_WORKERS_PER_CORE = float(os.getenv("PROCESSING_WORKERS_PER_CORE", "1"))
+PROCESSING_MAX_WORKERS = int(os.getenv("PROCESSING_MAX_WORKERS", "0"))  # 0 = no cap, -1 = run inline
+PROCESSING_QUEUE_SIZE = int(os.getenv("PROCESSING_QUEUE_SIZE", "32"))
+PROCESSING_TASK_TIMEOUT = float(os.getenv("PROCESSING_TASK_TIMEOUT", "30"))  # seconds
+PROCESSING_MAX_TASKS_PER_CHILD = int(os.getenv("PROCESSING_MAX_TASKS_PER_CHILD", "100"))
+
+# Derivative cache (processed results keyed by content hash and filter)
+DERIVATIVE_CACHE_DIR = os.getenv("DERIVATIVE_CACHE_DIR", os.path.join("uploads", "cache"))
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv("DERIVATIVE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 512MB
+DERIVATIVE_CACHE_PIN_SECONDS = int(os.getenv("DERIVATIVE_CACHE_PIN_SECONDS", "300"))  # served paths stay valid this long
+DERIVATIVE_CACHE_RESCAN_SECONDS = int(os.getenv("DERIVATIVE_CACHE_RESCAN_SECONDS", "30"))  # see what other workers wrote
+
+# HTTP caching of image responses
+IMAGE_CACHE_CONTROL = os.getenv("IMAGE_CACHE_CONTROL", "private, no-cache")
+
+# Responsive variants, only these widths and formats can be requested
+VARIANT_WIDTHS = sorted(int(w) for w in os.getenv("VARIANT_WIDTHS", "160,320,640,1280").split(","))
+VARIANT_FORMATS = set(os.getenv("VARIANT_FORMATS", "webp,jpeg,png").split(","))
+VARIANT_DEFAULT_FORMAT = os.getenv("VARIANT_DEFAULT_FORMAT", "webp")
+VARIANT_PREGENERATE = os.getenv("VARIANT_PREGENERATE", "true").lower() == "true"
+VARIANT_PREGENERATE_CONCURRENCY = int(os.getenv("VARIANT_PREGENERATE_CONCURRENCY", "1"))  # uploads pregenerated at once
+VARIANT_PREGENERATE_HEADROOM = int(os.getenv("VARIANT_PREGENERATE_HEADROOM", "8"))  # executor slots left for requests
+
+# Output encoding, formats negotiated from the Accept header in order of preference
+# (avif needs the optional pillow-avif-plugin package)
+IMAGE_NEGOTIATE_FORMATS = [f for f in os.getenv("IMAGE_NEGOTIATE_FORMATS", "avif,webp").split(",") if f]
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "75"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+WEBP_METHOD = int(os.getenv("WEBP_METHOD", "4"))  # effort, 0 fastest to 6 smallest
+AVIF_QUALITY = int(os.getenv("AVIF_QUALITY", "60"))
+AVIF_SPEED = int(os.getenv("AVIF_SPEED", "6"))  # 0 smallest to 10 fastest
+
+# Low resolution previews of a filter, longest side in pixels
+PREVIEW_DEFAULT_SIZE = int(os.getenv("PREVIEW_DEFAULT_SIZE", "320"))
+PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "1024"))
+
+# Batch processing
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_STALE_SECONDS = int(os.getenv("BATCH_STALE_SECONDS", "300"))  # running jobs without progress are resumed
+
+# Background jobs, "inline" runs batches inside the API, "queue" hands them to `python -m app.worker`
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "inline")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "0"))  # 0 = one per processing worker
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+
+# Request profiling. Requests slower than SLOW_REQUEST_MS (0 = off) are logged to
+# "http.slow" with their MongoDB operations, bytes read and time in Pillow. With
+# PROFILING_ENABLED, admins can profile one request with the X-Profile: 1 header
+# (or ?profile=1), and PROFILING_SAMPLE_RATE of the requests under PROFILING_PATHS
+# are profiled and kept when they turn out to be slow
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_PATHS = [p for p in os.getenv("PROFILING_PATHS", "/images").split(",") if p]
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "50"))  # oldest profiles are removed
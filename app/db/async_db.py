@@ -0,0 +1,42 @@
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.config import (
+    MONGO_URI,
+    MONGO_DB,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+from app.utils.metrics import mongo_command_counter
+
+_client: Optional[AsyncIOMotorClient] = None
+
+def pool_options() -> dict:
+    # Shared by the async client and the mongoengine connection
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        # Commands per collection and per request, see /metrics
+        "event_listeners": [mongo_command_counter],
+    }
+
+def connect_async_db(client: Optional[AsyncIOMotorClient] = None) -> AsyncIOMotorClient:
+    global _client
+    _client = client or AsyncIOMotorClient(MONGO_URI, **pool_options())
+    return _client
+
+def get_database() -> AsyncIOMotorDatabase:
+    if _client is None:
+        connect_async_db()
+    return _client[MONGO_DB]
+
+def close_async_db():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,52 +1,44 @@
 from mongoengine import connect, disconnect
-from app.config import MONGO_URI
+from app.config import MONGO_URI, MONGO_DB, MIGRATIONS_ON_STARTUP
+from app.db.async_db import pool_options, connect_async_db, close_async_db
 from app.models.user import User
 from app.models.images import Image
+from app.models.blob import Blob
+from app.models.batch import BatchJob
+from app.models.job import Job
+from app.db.migrations import run_migrations
+from app.utils.logger import setup_logger
 
-def migrate_image_data():
-    try:
-        # Get all images that have transformations field
-        images = Image.objects(__raw__={'transformations': {'$exists': True}})
-        
-        for image in images:
-            # Get the first transformation if it exists
-            if image.transformations and len(image.transformations) > 0:
-                image.filter_name = image.transformations[0]
-                # If it's brightness, try to get the value
-                if image.filter_name == 'brightness' and len(image.transformations) > 1:
-                    try:
-                        image.filter_value = str(float(image.transformations[1]))
-                    except:
-                        image.filter_value = None
-            else:
-                image.filter_name = None
-                image.filter_value = None
-            
-            # Remove the old field
-            image._data.pop('transformations', None)
-            image.save()
-            
-        print("Image data migration completed successfully.")
-    except Exception as e:
-        print(f"Error during image data migration: {str(e)}")
+logger = setup_logger("db")
+
+def connect_db():
+    # Connect to the MongoDB database
+    connect(host=MONGO_URI, db=MONGO_DB, **pool_options())
+    connect_async_db()
 
 def init_db():
     try:
-        # Connect to the MongoDB database
-        connect(host=MONGO_URI, db='imgbest')
+        connect_db()
+        
+        # The async repositories bypass mongoengine, create the indexes here
+        for model in (User, Image, Blob, BatchJob, Job):
+            model.ensure_indexes()
         
         # Check if the database is empty
         if not User._get_collection().count_documents({}):
-            print("Initializing database...")
+            logger.info("Initializing database...")
             pass
             
-        # Run migration for existing images
-        migrate_image_data()
+        # Versioned migrations, each one runs once. If another instance is
+        # applying them this one starts without waiting
+        if MIGRATIONS_ON_STARTUP:
+            run_migrations(wait=False)
             
-        print("Database initialized successfully.")
+        logger.info("Database initialized successfully.")
     except Exception as e:
-        print(f"Error initializing data base: {str(e)}")
+        logger.error(f"Error initializing data base: {str(e)}")
         raise e
 
 def close_db():
-    disconnect() 
\ No newline at end of file
+    disconnect()
+    close_async_db() 
\ No newline at end of file
@@ -0,0 +1,19 @@
+from app.db.migrations.base import Migration, MigrationContext, bulk_update
+from app.db.migrations.runner import (
+    MIGRATIONS,
+    MigrationLockTimeout,
+    applied_versions,
+    pending_migrations,
+    run_migrations,
+)
+
+__all__ = [
+    "Migration",
+    "MigrationContext",
+    "bulk_update",
+    "MIGRATIONS",
+    "MigrationLockTimeout",
+    "applied_versions",
+    "pending_migrations",
+    "run_migrations",
+]
@@ -0,0 +1,72 @@
+import logging
+import time
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+
+class MigrationContext:
+    """What a migration gets besides the database: batch size and progress reporting."""
+
+    def __init__(self, batch_size: int, logger: logging.Logger, on_progress: Optional[Callable[[], None]] = None):
+        self.batch_size = batch_size
+        self.logger = logger
+        self._on_progress = on_progress
+        self._last_report = 0.0
+
+    def progress(self, name: str, done: int, total: int, force: bool = False) -> None:
+        # Called after every batch, logged at most every few seconds
+        if self._on_progress:
+            self._on_progress()
+        now = time.monotonic()
+        if force or now - self._last_report >= 5:
+            self._last_report = now
+            percent = 100 * done / total if total else 100
+            self.logger.info(f"Migration {name}: {done}/{total} documents ({percent:.0f}%)")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    run: Callable[[Database, MigrationContext], None]
+
+
+def bulk_update(
+    collection: Collection,
+    query: dict,
+    build_update: Callable[[dict], Optional[dict]],
+    context: MigrationContext,
+    name: str,
+    projection: Optional[dict] = None,
+) -> int:
+    """
+    Walk the documents matching query and send the update built for each
+    one in bulk_write batches of context.batch_size. build_update returns
+    the update document, or None to leave that document alone. Returns the
+    number of documents modified.
+    """
+    total = collection.count_documents(query)
+    done = 0
+    modified = 0
+    batch: List[UpdateOne] = []
+
+    def flush():
+        nonlocal modified
+        if batch:
+            modified += collection.bulk_write(batch, ordered=False).modified_count
+            batch.clear()
+
+    cursor: Iterable[dict] = collection.find(query, projection=projection, batch_size=context.batch_size)
+    for doc in cursor:
+        update = build_update(doc)
+        if update:
+            batch.append(UpdateOne({"_id": doc["_id"]}, update))
+        done += 1
+        if len(batch) >= context.batch_size:
+            flush()
+            context.progress(name, done, total)
+    flush()
+    context.progress(name, done, total, force=True)
+    return modified
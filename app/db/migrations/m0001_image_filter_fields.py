@@ -0,0 +1,42 @@
+from pymongo.database import Database
+
+from app.db.migrations.base import Migration, MigrationContext, bulk_update
+from app.models.images import Image
+
+NAME = "image_filter_fields"
+
+
+def filter_fields(doc: dict):
+    # transformations was [filter, value], brightness is the only filter with a number
+    transformations = doc.get("transformations") or []
+    if not transformations or doc.get("filter_name") is not None:
+        return None
+    update = {"filter_name": transformations[0]}
+    if transformations[0] == "brightness" and len(transformations) > 1:
+        try:
+            update["filter_value"] = str(float(transformations[1]))
+        except (TypeError, ValueError):
+            update["filter_value"] = None
+    return {"$set": update}
+
+
+def run(db: Database, context: MigrationContext) -> None:
+    """
+    Move the legacy transformations list to filter_name/filter_value, then
+    drop the old field. Images that already have a filter keep it.
+    """
+    images = db[Image._get_collection_name()]
+    modified = bulk_update(
+        images,
+        {"transformations.0": {"$exists": True}},
+        filter_fields,
+        context,
+        NAME,
+        projection={"transformations": 1, "filter_name": 1},
+    )
+    context.logger.info(f"Migration {NAME}: filter fields set on {modified} images")
+    result = images.update_many({"transformations": {"$exists": True}}, {"$unset": {"transformations": ""}})
+    context.logger.info(f"Migration {NAME}: transformations removed from {result.modified_count} images")
+
+
+migration = Migration(1, NAME, run)
@@ -0,0 +1,117 @@
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from mongoengine.connection import get_db
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from app.config import MIGRATION_BATCH_SIZE, MIGRATION_LOCK_SECONDS
+from app.db.migrations.base import Migration, MigrationContext
+from app.db.migrations import m0001_image_filter_fields
+from app.utils.logger import setup_logger
+
+logger = setup_logger("migrations")
+
+# In order, a version is never reused or renumbered
+MIGRATIONS: List[Migration] = [
+    m0001_image_filter_fields.migration,
+]
+
+APPLIED_COLLECTION = "migrations"
+LOCK_COLLECTION = "migration_locks"
+LOCK_ID = "migrations"
+
+
+class MigrationLockTimeout(Exception):
+    """Raised when another process held the migration lock for too long."""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def applied_versions(db: Database) -> set:
+    return {raw["_id"] for raw in db[APPLIED_COLLECTION].find({}, projection={"_id": 1})}
+
+
+def pending_migrations(db: Database, target: Optional[int] = None) -> List[Migration]:
+    applied = applied_versions(db)
+    return [
+        m for m in MIGRATIONS
+        if m.version not in applied and (target is None or m.version <= target)
+    ]
+
+
+def acquire_lock(db: Database, owner: str, lease_seconds: int = MIGRATION_LOCK_SECONDS) -> bool:
+    """
+    Take the migration lock, or renew it if we hold it. A lock whose lease
+    expired (its process died) can be taken by anyone.
+    """
+    now = datetime.now()
+    try:
+        db[LOCK_COLLECTION].find_one_and_update(
+            {"_id": LOCK_ID, "$or": [{"lease_until": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=lease_seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock exists and someone else holds it
+        return False
+
+
+def release_lock(db: Database, owner: str) -> None:
+    db[LOCK_COLLECTION].delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+def run_migrations(
+    db: Optional[Database] = None,
+    target: Optional[int] = None,
+    wait: bool = True,
+    wait_seconds: float = MIGRATION_LOCK_SECONDS,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+) -> List[int]:
+    """
+    Apply the pending migrations up to target, each one once, while holding
+    the migration lock so only one process migrates at a time. When the
+    lock is taken, wait for it (up to wait_seconds, then raise
+    MigrationLockTimeout), or with wait=False return right away and let the
+    other process finish. Returns the versions applied by this call.
+    """
+    db = db if db is not None else get_db()
+    if not pending_migrations(db, target):
+        return []
+
+    owner = default_owner()
+    deadline = time.monotonic() + wait_seconds
+    while not acquire_lock(db, owner):
+        if not wait:
+            logger.info("Migrations are being applied by another process, skipping")
+            return []
+        if time.monotonic() >= deadline:
+            raise MigrationLockTimeout("Timed out waiting for the migration lock")
+        time.sleep(1)
+
+    applied = []
+    try:
+        # Checked again under the lock, the previous holder may have done them
+        for migration in pending_migrations(db, target):
+            logger.info(f"Applying migration {migration.version} ({migration.name})")
+            context = MigrationContext(batch_size, logger, on_progress=lambda: acquire_lock(db, owner))
+            started = time.monotonic()
+            migration.run(db, context)
+            duration = time.monotonic() - started
+            db[APPLIED_COLLECTION].insert_one({
+                "_id": migration.version,
+                "name": migration.name,
+                "applied_at": datetime.now(),
+                "duration_seconds": round(duration, 3),
+            })
+            applied.append(migration.version)
+            logger.info(f"Migration {migration.version} ({migration.name}) applied in {duration:.1f}s")
+    finally:
+        release_lock(db, owner)
+    return applied
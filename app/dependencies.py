@@ -1,7 +1,9 @@
 from fastapi import Depends, HTTPException, status, Request
 from app.utils.jwt import verify_token
-from app.models.user import User
-from mongoengine.errors import DoesNotExist
+from app.repositories import user_repository
+from app.services.principal_cache import principal_cache
+
+ADMIN_ROLE = "admin"
 
 async def get_current_user(request: Request):
     credentials_exception = HTTPException(
@@ -21,13 +23,38 @@ async def get_current_user(request: Request):
     except ValueError:
         raise credentials_exception
 
-    payload = verify_token(token, credentials_exception)
+    user = await user_from_token(token, credentials_exception)
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def user_from_token(token: str, credentials_exception: Exception):
+    """
+    User behind a bearer token, None when the user no longer exists.
+    Raises credentials_exception when the token is invalid.
+    """
+    payload = principal_cache.get_token(token)
+    if payload is None:
+        payload = verify_token(token, credentials_exception)
+        principal_cache.put_token(token, payload)
     user_id: str = payload.get("sub")
     if user_id is None:
         raise credentials_exception
     
-    try:
-        user = User.objects.get(id=user_id)
-        return user
-    except DoesNotExist:
-        raise credentials_exception 
\ No newline at end of file
+    # Cached until the user changes, see UserRepository.update
+    user = await principal_cache.get_user(user_id)
+    if user is None:
+        generation = await principal_cache.generation()
+        user = await user_repository.get(user_id)
+        if user is None:
+            return None
+        await principal_cache.put_user(user, generation)
+    return user
+
+async def get_admin_user(current_user = Depends(get_current_user)):
+    if current_user.role != ADMIN_ROLE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
@@ -1,9 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import user, auth, images
-from app.db.init_db import init_db
-from app.utils.logger import app_logger
-from app.config import ALLOWED_ORIGINS
+from app.routes import user, auth, images, admin
+from app.db.init_db import init_db, close_db
+from app.services.executor import processing_executor
+from app.services.password_executor import password_executor
+from app.services.batch import watch_batch_jobs
+from app.services.derivative_cache import derivative_cache
+from app.services.principal_cache import principal_cache
+import asyncio
+import os
+from app.utils.logger import app_logger, enable_file_logging
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.utils.metrics import registry
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.config import ALLOWED_ORIGINS, PROCESSING_MODE
 
 app = FastAPI(
     title="API",
@@ -15,13 +27,44 @@ app.add_middleware(
     allow_credentials=True,  
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend: request id, the next page of the listings and the profile id
+    expose_headers=["X-Request-ID", "X-Next-Cursor", "Link", "X-Profile-ID"],
 )
 
+# Inside the metrics middleware, it reads the per request stats it collects
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Added last so it wraps everything, including CORS and the metrics
+app.add_middleware(RequestContextMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
+    enable_file_logging()
     app_logger.info("Starting the app...")
     init_db()
     app_logger.info("Database initialized")
+    # uvicorn --workers defaults to WEB_CONCURRENCY
+    if not principal_cache.backend.shared and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        app_logger.warning(
+            "PRINCIPAL_CACHE_BACKEND=memory with several workers: user changes reach the "
+            "other workers only when their cache entry expires, use redis"
+        )
+    processing_executor.start()
+    app_logger.info(f"Processing executor started with {processing_executor.workers} workers")
+    # In queue mode batches are run by `python -m app.worker`
+    app.state.batch_watcher = None
+    if PROCESSING_MODE != "queue":
+        app.state.batch_watcher = asyncio.create_task(watch_batch_jobs())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if app.state.batch_watcher:
+        app.state.batch_watcher.cancel()
+    processing_executor.shutdown()
+    password_executor.shutdown()
+    app_logger.info("Processing executor stopped")
+    await principal_cache.close()
+    close_db()
 
 @app.get("/")
 async def root():
@@ -33,8 +76,21 @@ async def health():
     app_logger.info("Health check endpoint accessed")
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text format, each worker process reports its own numbers
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@app.get("/health/caches")
+async def cache_stats():
+    return {
+        "principal": principal_cache.stats(),
+        "derivative": derivative_cache.stats(),
+    }
+
 app.include_router(user.router, prefix="/users", tags=["users"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(images.router, prefix="/images", tags=["images"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 app_logger.info("APP STARTED, LET'S GO!!!!! 🚀")
\ No newline at end of file
@@ -0,0 +1,71 @@
+import time
+from typing import Callable, Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import (
+    http_request_duration,
+    http_requests_in_flight,
+    http_response_bytes,
+    mongo_operations_per_request,
+    RequestStats,
+    request_stats_var,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Records latency, response bytes and MongoDB operations per route
+    template (/images/{image_id}/file, not every image id), plus the
+    number of requests in flight.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._routes: Dict[Callable, str] = {}
+
+    def route_template(self, scope: Scope) -> str:
+        # The router leaves the matched endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if endpoint not in self._routes:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = UNMATCHED_ROUTE
+        return self._routes[endpoint]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats_var.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        body_bytes = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_requests_in_flight.dec()
+            route = self.route_template(scope)
+            http_request_duration.labels(scope["method"], route, str(status_code)).observe(time.perf_counter() - started)
+            http_response_bytes.labels(route).inc(body_bytes)
+            mongo_operations_per_request.labels(route).observe(stats.mongo_ops)
+            request_stats_var.reset(token)
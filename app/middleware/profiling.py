@@ -0,0 +1,160 @@
+import asyncio
+import cProfile
+import logging
+import random
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import PROFILING_ENABLED, PROFILING_PATHS, PROFILING_SAMPLE_RATE, SLOW_REQUEST_MS
+from app.services.profiles import save_profile
+from app.utils.logger import request_id_var, setup_logger
+from app.utils.metrics import request_stats_var
+
+slow_logger = setup_logger("http.slow")
+
+PROFILE_ID_HEADER = "X-Profile-ID"
+TRUE_VALUES = {"1", "true", "yes"}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ProfilingMiddleware:
+    """
+    Logs requests slower than slow_ms to "http.slow" with what they cost:
+    MongoDB operations, bytes read from disk and time waiting on Pillow
+    (read from the RequestStats of MetricsMiddleware, so this has to run
+    inside it).
+
+    When enabled, a request is run under cProfile if an admin asks for it
+    with the X-Profile: 1 header or ?profile=1, the profile id is returned
+    in X-Profile-ID; or at random, sample_rate of the requests under paths,
+    kept only when the request turns out to be slow. Profiles are stored
+    by app.services.profiles and downloaded from /admin/profiles.
+
+    cProfile sees the event loop thread, so other requests handled at the
+    same time show up in the profile too, and only one request per process
+    is profiled at a time.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        enabled: bool = PROFILING_ENABLED,
+        slow_ms: float = SLOW_REQUEST_MS,
+        sample_rate: float = PROFILING_SAMPLE_RATE,
+        paths=PROFILING_PATHS,
+    ):
+        self.app = app
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.paths = tuple(paths)
+        self._profiling = False
+
+    @staticmethod
+    def profile_flag(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value.decode("latin-1").lower() in TRUE_VALUES
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", [""])[0].lower() in TRUE_VALUES
+
+    @staticmethod
+    async def is_admin(scope: Scope) -> bool:
+        # Imported here, the middleware is created before the routes
+        from app.dependencies import ADMIN_ROLE, user_from_token
+
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return False
+                try:
+                    user = await user_from_token(token.strip(), InvalidToken())
+                except InvalidToken:
+                    return False
+                return user is not None and user.role == ADMIN_ROLE
+        return False
+
+    async def trigger(self, scope: Scope) -> Optional[str]:
+        """Why this request gets profiled, "request" or "sampled", None when it does not."""
+        if not self.enabled or self._profiling:
+            return None
+        if self.profile_flag(scope):
+            # Anyone else asking is served as usual, without a profile
+            return "request" if await self.is_admin(scope) else None
+        if self.sample_rate > 0 and scope["path"].startswith(self.paths) and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trigger = await self.trigger(scope)
+        if trigger and self._profiling:
+            # Another request started a profile while the admin was looked up
+            trigger = None
+        profile_id = uuid4().hex if trigger else None
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if trigger == "request":
+                    MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile_id
+            await send(message)
+
+        profiler = None
+        if trigger:
+            self._profiling = True
+            profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+            keep = trigger == "request" or (trigger == "sampled" and slow)
+            if slow or keep:
+                stats = request_stats_var.get()
+                info = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": duration_ms,
+                    "mongo_ops": stats.mongo_ops if stats else None,
+                    "read_bytes": stats.read_bytes if stats else None,
+                    "pillow_ms": round(stats.pillow_seconds * 1000, 2) if stats else None,
+                    "profile_id": profile_id if keep else None,
+                }
+                if keep:
+                    try:
+                        await asyncio.to_thread(
+                            save_profile, profiler, profile_id,
+                            {**info, "trigger": trigger, "request_id": request_id_var.get()}
+                        )
+                    except OSError as e:
+                        slow_logger.error(f"Could not store profile {profile_id}: {str(e)}")
+                        info["profile_id"] = None
+                slow_logger.log(
+                    logging.WARNING if slow else logging.INFO,
+                    "%s %s %s %.1fms, %s mongo ops, %s bytes read, %sms in pillow",
+                    scope["method"], scope["path"], status_code, duration_ms,
+                    info["mongo_ops"], info["read_bytes"], info["pillow_ms"],
+                    extra=info,
+                )
@@ -0,0 +1,54 @@
+"""
+Database migrations, outside of the API startup.
+
+    python -m app.migrate            apply the pending migrations
+    python -m app.migrate --target 3 apply up to version 3
+    python -m app.migrate --status   list the migrations and whether they ran
+
+Set MIGRATIONS_ON_STARTUP=false to leave migrations to this command, e.g.
+as a release step before a rolling deploy.
+"""
+import argparse
+import sys
+
+from mongoengine.connection import get_db
+
+from app.db.init_db import connect_db, close_db
+from app.db.migrations import MIGRATIONS, MigrationLockTimeout, applied_versions, run_migrations
+from app.utils.logger import enable_file_logging, setup_logger
+
+logger = setup_logger("migrate")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--target", type=int, default=None, help="highest version to apply")
+    parser.add_argument("--status", action="store_true", help="list the migrations and exit")
+    parser.add_argument("--batch-size", type=int, default=None, help="documents per bulk write")
+    args = parser.parse_args()
+
+    enable_file_logging()
+    connect_db()
+    try:
+        if args.status:
+            applied = applied_versions(get_db())
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version in applied else "pending"
+                print(f"{migration.version:>4}  {migration.name:<32} {state}")
+            return 0
+
+        options = {"target": args.target}
+        if args.batch_size:
+            options["batch_size"] = args.batch_size
+        applied = run_migrations(**options)
+        logger.info(f"Applied migrations: {applied or 'none'}")
+        return 0
+    except MigrationLockTimeout as e:
+        logger.error(str(e))
+        return 1
+    finally:
+        close_db()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+from mongoengine import (
+    Document,
+    EmbeddedDocument,
+    StringField,
+    IntField,
+    BooleanField,
+    DateTimeField,
+    ListField,
+    EmbeddedDocumentField,
+)
+from datetime import datetime
+
+BATCH_PENDING = "pending"
+BATCH_RUNNING = "running"
+BATCH_COMPLETED = "completed"
+
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+class BatchItem(EmbeddedDocument):
+    image_id = StringField(required=True)
+    status = StringField(default=ITEM_PENDING)
+    error = StringField(default=None)
+    cache_hit = BooleanField(default=None)
+    finished_at = DateTimeField(default=None)
+
+class BatchJob(Document):
+    user_id = StringField(required=True)
+    filter_name = StringField(required=True)
+    filter_value = StringField(default=None)
+    status = StringField(default=BATCH_PENDING)
+    total = IntField(default=0)
+    completed = IntField(default=0)
+    failed = IntField(default=0)
+    items = ListField(EmbeddedDocumentField(BatchItem), default=list)
+    # Instance running the job and its last sign of life, to resume after a restart
+    owner = StringField(default=None)
+    heartbeat_at = DateTimeField(default=None)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+    finished_at = DateTimeField(default=None)
+
+    meta = {
+        "collection": "batch_jobs",
+        "indexes": ["user_id", ("status", "heartbeat_at")],
+    }
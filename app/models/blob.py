@@ -0,0 +1,18 @@
+from mongoengine import Document, StringField, IntField, DateTimeField
+from datetime import datetime
+
+class Blob(Document):
+    # One stored original, shared by every image uploaded with the same bytes
+    content_hash = StringField(required=True, unique=True)  # SHA-256
+    key = StringField(required=True)
+    size = IntField(default=0)
+    format = StringField(default=None)
+    # Images pointing at the blob, it is deleted with the last one
+    refcount = IntField(default=0)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+    meta = {
+        "collection": "blobs",
+        "indexes": ["key"],
+    }
@@ -8,6 +8,7 @@ class Image(Document):
     original_filename = StringField(required=True)
     original_path = StringField(required=True)
     processed_path = StringField(required=True)
+    content_hash = StringField(default=None)  # SHA-256 of the original bytes
     filter_name = StringField(default=None)
     filter_value = StringField(default=None)
     transformations = ListField(StringField(), default=list)  # Keep for backward compatibility
@@ -17,6 +18,15 @@ class Image(Document):
     class Settings:
         name = "images"
 
+    # Listings filter by user (and filter) and page through (uploaded_at, _id),
+    # in either direction. Created at startup by init_db
+    meta = {
+        "indexes": [
+            ("user_id", "uploaded_at", "id"),
+            ("user_id", "filter_name", "uploaded_at", "id"),
+        ],
+    }
+
     def get_filter_name(self):
         if self.filter_name is not None:
             return self.filter_name
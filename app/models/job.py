@@ -0,0 +1,28 @@
+from mongoengine import Document, StringField, IntField, DateTimeField, DictField
+from datetime import datetime
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+class Job(Document):
+    kind = StringField(required=True)
+    payload = DictField(default=dict)
+    status = StringField(default=JOB_QUEUED)
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=5)
+    # Not claimable before run_at, retries push it forward with backoff
+    run_at = DateTimeField(default=datetime.now)
+    # A running job whose lease expired is claimed again by another worker
+    lease_until = DateTimeField(default=None)
+    worker_id = StringField(default=None)
+    last_error = StringField(default=None)
+    result = DictField(default=None)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+    meta = {
+        "collection": "jobs",
+        "indexes": [("status", "run_at"), ("status", "lease_until")],
+    }
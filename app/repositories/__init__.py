@@ -0,0 +1,11 @@
+from app.repositories.base import Repository
+from app.repositories.users import UserRepository, user_repository
+from app.repositories.images import ImageRepository, image_repository
+
+__all__ = [
+    "Repository",
+    "UserRepository",
+    "ImageRepository",
+    "user_repository",
+    "image_repository",
+]
@@ -0,0 +1,98 @@
+from typing import Any, Generic, List, Optional, Type, TypeVar
+
+from bson import ObjectId
+from mongoengine import Document
+from mongoengine.errors import NotUniqueError
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db.async_db import get_database
+
+T = TypeVar("T", bound=Document)
+
+
+class Repository(Generic[T]):
+    """
+    Async access to the collection of a mongoengine model, through the
+    Motor client so database round-trips never block the event loop.
+    Documents are loaded into the mongoengine classes, so the rest of the
+    code keeps working with the same objects.
+    """
+
+    document: Type[T]
+
+    @property
+    def collection(self):
+        return get_database()[self.document._get_collection_name()]
+
+    def load(self, raw: Optional[dict]) -> Optional[T]:
+        return self.document._from_son(raw) if raw else None
+
+    def to_mongo(self, **values) -> dict:
+        # Field names and python values to db names and BSON values
+        fields = self.document._fields
+        return {
+            fields[name].db_field: None if value is None else fields[name].to_mongo(value)
+            for name, value in values.items()
+        }
+
+    async def get(self, document_id: Any) -> Optional[T]:
+        if not ObjectId.is_valid(str(document_id)):
+            return None
+        return self.load(await self.collection.find_one({"_id": ObjectId(str(document_id))}))
+
+    async def get_or_raise(self, document_id: Any) -> T:
+        """Like Model.objects.get(id=...), raises the model's DoesNotExist."""
+        document = await self.get(document_id)
+        if document is None:
+            raise self.document.DoesNotExist(f"{self.document.__name__} {document_id} does not exist")
+        return document
+
+    async def find_one(self, query: dict, **kwargs) -> Optional[T]:
+        return self.load(await self.collection.find_one(query, **kwargs))
+
+    async def find(self, query: dict, sort=None, limit: int = 0, projection=None) -> List[T]:
+        return [self.load(raw) for raw in await self.find_raw(query, sort, limit, projection)]
+
+    async def find_raw(self, query: dict, sort=None, limit: int = 0, projection=None) -> List[dict]:
+        """
+        Raw documents, like QuerySet.as_pymongo(). Skips building the model
+        objects, for read paths that map straight to the response.
+        """
+        cursor = self.collection.find(query, projection=projection, sort=sort, limit=limit)
+        return await cursor.to_list(length=None)
+
+    async def insert(self, document: T) -> T:
+        """Validate and insert a new document, like Document.save() would."""
+        document.validate()
+        son = document.to_mongo()
+        son.pop("_id", None)
+        try:
+            result = await self.collection.insert_one(son)
+        except DuplicateKeyError as e:
+            raise NotUniqueError(str(e)) from e
+        document.pk = result.inserted_id
+        document._clear_changed_fields()
+        document._created = False
+        return document
+
+    async def update(self, document: T, **values) -> T:
+        """Set fields on a stored document, in the database and on the object."""
+        for name, value in values.items():
+            setattr(document, name, value)
+        try:
+            await self.collection.update_one({"_id": document.pk}, {"$set": self.to_mongo(**values)})
+        except DuplicateKeyError as e:
+            raise NotUniqueError(str(e)) from e
+        document._clear_changed_fields()
+        return document
+
+    async def find_one_and_update(self, query: dict, update: dict, **kwargs) -> Optional[T]:
+        raw = await self.collection.find_one_and_update(
+            query, update, return_document=ReturnDocument.AFTER, **kwargs
+        )
+        return self.load(raw)
+
+    async def delete(self, document: T) -> bool:
+        result = await self.collection.delete_one({"_id": document.pk})
+        return result.deleted_count > 0
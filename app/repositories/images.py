@@ -0,0 +1,31 @@
+from typing import List, Optional
+
+from bson import ObjectId
+
+from app.models.images import Image
+from app.repositories.base import Repository
+
+
+class ImageRepository(Repository[Image]):
+    document = Image
+
+    # Fields of the image listings
+    SUMMARY_FIELDS = {
+        "original_filename": 1, "original_path": 1, "processed_path": 1,
+        "filter_name": 1, "filter_value": 1, "transformations": 1, "uploaded_at": 1,
+    }
+
+    def user_query(self, user_id: str, processed: bool = False, filter_name: Optional[str] = None) -> dict:
+        query = {"user_id": str(user_id)}
+        if filter_name is not None:
+            query["filter_name"] = filter_name
+        elif processed:
+            query["filter_name"] = {"$ne": None}
+        return query
+
+    async def owned_ids(self, user_id: str, image_ids: List[ObjectId]) -> List[str]:
+        cursor = self.collection.find({"_id": {"$in": image_ids}, "user_id": str(user_id)}, projection={"_id": 1})
+        return [str(raw["_id"]) async for raw in cursor]
+
+
+image_repository = ImageRepository()
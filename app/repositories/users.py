@@ -0,0 +1,38 @@
+from typing import List, Optional
+
+from app.models.user import User
+from app.repositories.base import Repository
+from app.services.principal_cache import principal_cache
+
+
+class UserRepository(Repository[User]):
+    document = User
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return await self.find_one({"email": email})
+
+    # Everything but the password hash
+    PUBLIC_FIELDS = {"password_hash": 0}
+
+    async def list_all(self) -> List[User]:
+        return await self.find({}, sort=[("_id", 1)])
+
+    async def list_public(self) -> List[dict]:
+        return await self.find_raw({}, sort=[("_id", 1)], projection=self.PUBLIC_FIELDS)
+
+    # Every change to a user drops it from the principal cache, so a profile
+    # update or a deactivation is seen by the next request
+    async def update(self, document: User, **values) -> User:
+        try:
+            return await super().update(document, **values)
+        finally:
+            await principal_cache.invalidate_user(str(document.pk))
+
+    async def delete(self, document: User) -> bool:
+        try:
+            return await super().delete(document)
+        finally:
+            await principal_cache.invalidate_user(str(document.pk))
+
+
+user_repository = UserRepository()
@@ -0,0 +1,30 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.dependencies import get_admin_user
+from app.services.profiles import list_profiles, profile_path, profile_text
+
+router = APIRouter()
+
+# Request profiles captured by ProfilingMiddleware
+@router.get("/profiles")
+async def get_profiles(admin = Depends(get_admin_user)):
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("prof", pattern="^(prof|text)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    admin = Depends(get_admin_user),
+):
+    """The profile in pstats format, or with format=text its top functions by cumulative time."""
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    if format == "text":
+        return PlainTextResponse(profile_text(path, limit))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1,17 +1,25 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Response
 from app.models.user import User
 from app.schemas.user import UserCreate, UserInDB, UserLogin, UserUpdate
-from app.utils.password import verify_password, get_password_hash
+from app.services.password_executor import PasswordExecutorSaturated, check_password, hash_password
 from app.utils.jwt import create_access_token
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_RETRY_AFTER
 from datetime import timedelta
 from mongoengine.errors import DoesNotExist, NotUniqueError, ValidationError
 from app.dependencies import get_current_user
+from app.repositories import user_repository
 from app.utils.logger import setup_logger
 
 router = APIRouter()
 logger = setup_logger("auth")
 
+def hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many authentication requests, try again later",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+    )
+
 # Register user
 @router.post("/register", response_model=UserInDB)
 async def register(user: UserCreate):
@@ -19,10 +27,10 @@ async def register(user: UserCreate):
         logger.info(f"Attempted registration for email: {user.email}")
         user_data = user.dict()
         password = user_data.pop('password')
-        user_data['password_hash'] = get_password_hash(password)
+        user_data['password_hash'] = await hash_password(password)
         
         user = User(**user_data)
-        user.save()
+        await user_repository.insert(user)
         
         logger.info(f"User register succesfully: {user.email}")
         return UserInDB(
@@ -41,13 +49,18 @@ async def register(user: UserCreate):
     except ValidationError as e:
         logger.error(f"Validation error in register: {str(e)}")
         raise HTTPException(status_code=422, detail=str(e))
+    except PasswordExecutorSaturated:
+        logger.warning(f"Password hashing busy, rejecting registration for: {user.email}")
+        raise hashing_busy()
 
 # Login user
 @router.post("/login")
 async def login(response: Response, user: UserLogin):
     try:
         logger.info(f"Attempting login for email: {user.email}")
-        user_in_db = User.objects.get(email=user.email)
+        user_in_db = await user_repository.get_by_email(user.email)
+        if user_in_db is None:
+            raise DoesNotExist(f"User {user.email} does not exist")
         
         # Check if the user is active
         if not user_in_db.is_active:
@@ -58,7 +71,7 @@ async def login(response: Response, user: UserLogin):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        password_valid = verify_password(user.password, user_in_db.password_hash)
+        password_valid, new_hash = await check_password(user.password, user_in_db.password_hash)
         if not password_valid:
             logger.warning(f"Invalid password for user: {user.email}")
             raise HTTPException(
@@ -67,6 +80,11 @@ async def login(response: Response, user: UserLogin):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        # Stored with another bcrypt cost, upgrade it now that we have the password
+        if new_hash:
+            await user_repository.update(user_in_db, password_hash=new_hash)
+            logger.info(f"Password hash upgraded for user: {user.email}")
+        
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
             data={
@@ -100,6 +118,9 @@ async def login(response: Response, user: UserLogin):
             }
         }
         
+    except PasswordExecutorSaturated:
+        logger.warning(f"Password hashing busy, rejecting login for: {user.email}")
+        raise hashing_busy()
     except DoesNotExist:
         logger.warning(f"Login attempt for non-existent user: {user.email}")
         raise HTTPException(
@@ -125,10 +146,9 @@ async def update_profile(
         update_data = user_update.dict(exclude_unset=True)
         
         if 'password' in update_data:
-            update_data['password_hash'] = get_password_hash(update_data.pop('password'))
+            update_data['password_hash'] = await hash_password(update_data.pop('password'))
         
-        current_user.update(**update_data)
-        current_user.reload()
+        await user_repository.update(current_user, **update_data)
         
         logger.info(f"Profile successfully updated for user: {current_user.email}")
         return UserInDB(
@@ -147,6 +167,9 @@ async def update_profile(
     except NotUniqueError:
         logger.warning(f"Update attempt with duplicate email: {current_user.email}")
         raise HTTPException(status_code=400, detail="Email already exists")
+    except PasswordExecutorSaturated:
+        logger.warning(f"Password hashing busy, rejecting profile update for: {current_user.email}")
+        raise hashing_busy()
 
 # Delete user
 # Well i dont think this is a good idea, but here its for the fure
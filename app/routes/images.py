@@ -1,51 +1,184 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Body
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, status, Body, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from app.models.images import Image
 from app.models.user import User
 from app.dependencies import get_current_user
-from app.services.storage import save_upload_file
-from app.services.image_processor import proccess_image
-from typing import List
+from app.services.storage import save_upload_file, storage_key
+from app.storage import BlobNotFound, storage
+from app.services.blobs import acquire_blob, release_blob
+from app.repositories import image_repository
+from app.services.image_processor import output_format, preview_filter
+from app.services.processing import ensure_content_hash, render_image, original_file, processed_file
+from app.services.batch import create_batch_job, schedule_batch_job, enqueue_batch_job
+from app.models.batch import BatchJob, BATCH_COMPLETED
+from mongoengine.errors import ValidationError
+from app.services.pipeline import FILTERS, format_operations
+from app.services.filters import validate_parameter
+from app.services.executor import ExecutorSaturated
+from app.services.variants import get_variant, is_allowed_variant, pregenerate_variants
+from app.services.encoding import encoder_signature, mime_type, negotiate_format, normalize_format
+from app.services.gallery import (
+    image_mime_type,
+    existing_entries,
+    stream_gallery_json,
+    stream_gallery_ndjson,
+)
+from typing import List, Literal, Optional, Tuple
 from app.utils.validate_image import validate_image
+from app.utils.responses import FastJSONResponse
+from app.utils.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_SORT
+from app.utils.http_cache import (
+    make_etag,
+    cache_headers,
+    is_not_modified,
+    not_modified_response,
+    file_response,
+)
 from app.utils.logger import setup_logger
+from app.config import VARIANT_WIDTHS, VARIANT_FORMATS, VARIANT_DEFAULT_FORMAT, VARIANT_PREGENERATE, BATCH_MAX_IMAGES, PROCESSING_MODE, IMAGE_NEGOTIATE_FORMATS, PREVIEW_DEFAULT_SIZE, PREVIEW_MAX_SIZE
 import os
 import base64
-from pydantic import BaseModel
+from uuid import uuid4
+import asyncio
+from pydantic import BaseModel, Field, model_validator
+
+
+MAX_PIPELINE_OPERATIONS = 10
+
+# Listing order, see SORT_OPTIONS in app.utils.pagination
+SortOrder = Literal["uploaded_at", "-uploaded_at"]
+
+
+class FilterOperation(BaseModel):
+    name: str
+    value: Optional[float] = None
 
 
 class FilterRequest(BaseModel):
-    filter_name: str
+    # Either a single filter or an ordered pipeline of operations
+    filter_name: Optional[str] = None
+    filter_value: Optional[float] = None
+    operations: Optional[List[FilterOperation]] = None
+
+    @model_validator(mode="after")
+    def check_filters(self):
+        if (self.filter_name is None) == (self.operations is None):
+            raise ValueError("Provide either filter_name or operations")
+        if self.operations is not None and not 0 < len(self.operations) <= MAX_PIPELINE_OPERATIONS:
+            raise ValueError(f"A pipeline must have between 1 and {MAX_PIPELINE_OPERATIONS} operations")
+        operations = self.operations or [FilterOperation(name=self.filter_name, value=self.filter_value)]
+        for op in operations:
+            if op.name not in FILTERS:
+                raise ValueError(f"Unknown filter: {op.name}. Available filters: {', '.join(sorted(FILTERS))}")
+            validate_parameter(op.name, op.value)
+        return self
+
+    def to_operations(self):
+        operations = self.operations or [FilterOperation(name=self.filter_name, value=self.filter_value)]
+        return [
+            (op.name, None if op.value is None else f"{op.value:g}")
+            for op in operations
+        ]
+
+
+class BatchRequest(FilterRequest):
+    image_ids: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_IMAGES)
 
 
 router = APIRouter()
 logger = setup_logger("images")
+# Per-image access lines, sampled (LOG_SAMPLING) and formatted lazily
+access_logger = setup_logger("images.access")
+
+async def resolve_image_file(image: Image) -> Tuple[str, bool]:
+    # Local path of the current processed image, if not of the original, and
+    # whether it is the original. Raises BlobNotFound when there is neither
+    processed_path = await processed_file(image)
+    if processed_path:
+        return processed_path, False
+    return await original_file(image), True
+
+def image_validators(image: Image, representation: str, fmt: str, original: bool = False):
+    # ETag and Last-Modified of what will be sent, taken from the document so
+    # conditional requests are answered without touching the file. The
+    # encoder settings are part of it, re-encoded bytes change with them
+    encoder = encoder_signature(fmt)
+    if original:
+        etag = make_etag(image.content_hash, representation, encoder)
+        return etag, image.uploaded_at
+    etag = make_etag(image.content_hash, image.filter_name, image.filter_value, representation, encoder)
+    return etag, image.updated_at or image.uploaded_at
+
+def negotiated_format(request: Request, image: Image) -> str:
+    # Format of the stored file, or a lighter one the client says it accepts
+    return negotiate_format(request.headers.get("accept"), output_format(image.original_path))
+
+def vary_on_accept(headers: dict) -> dict:
+    if IMAGE_NEGOTIATE_FORMATS:
+        headers["Vary"] = "Accept"
+    return headers
+
+async def encoded_file(image: Image, source_path: str, is_original: bool, width: Optional[int], fmt: str) -> str:
+    # source_path as is when nothing changes, if not its cached variant
+    if width is None and normalize_format(output_format(source_path)) == fmt:
+        return source_path
+    return await get_variant(
+        source_path,
+        image.content_hash,
+        None if is_original else image.filter_name,
+        None if is_original else image.filter_value,
+        width,
+        fmt
+    )
+
+def image_summary(raw: dict) -> dict:
+    # Listing entry built from a raw document, same fallbacks as Image.get_filter_name/value
+    transformations = raw.get("transformations") or []
+    filter_name = raw.get("filter_name")
+    filter_value = raw.get("filter_value")
+    if filter_name is None and len(transformations) > 0:
+        filter_name = transformations[0]
+    if filter_value is None and len(transformations) > 1:
+        filter_value = transformations[1]
+    return {
+        "id": str(raw["_id"]),
+        "original_filename": raw.get("original_filename"),
+        "original_path": raw.get("original_path"),
+        "processed_path": raw.get("processed_path"),
+        "filter_name": filter_name,
+        "filter_value": filter_value,
+        "uploaded_at": raw.get("uploaded_at")
+    }
+
+def gallery_query(current_user: User, kind: str, filter_name: Optional[str] = None) -> dict:
+    return image_repository.user_query(str(current_user.id), processed=kind == "processed", filter_name=filter_name)
 
-def normalize_path(path: str) -> str:
-    return os.path.normpath(path).replace("\\", "/")
+def gallery_response(entries: List[tuple], next_cursor: Optional[str], format: str) -> StreamingResponse:
+    # Files are read and encoded while the response is sent, one at a time
+    entries = existing_entries(entries)
+    if format == "ndjson":
+        return StreamingResponse(stream_gallery_ndjson(entries, next_cursor), media_type="application/x-ndjson")
+    return StreamingResponse(stream_gallery_json(entries, next_cursor), media_type="application/json")
 
 # Upload image
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
     logger.info(f"Image upload attempt by user: {current_user.email}")
     validate_image(file)
     
-    # Create directories if they don't exist
-    upload_dir = normalize_path(os.path.join("uploads", "original"))
-    processed_dir = normalize_path(os.path.join("uploads", "processed"))
-    os.makedirs(upload_dir, exist_ok=True)
-    os.makedirs(processed_dir, exist_ok=True)
+    # Spool the upload, checking size and format and hashing it on the way, then
+    # store it unless the same bytes were already uploaded
+    spooled = await asyncio.to_thread(save_upload_file, file)
+    blob = await asyncio.to_thread(acquire_blob, spooled)
+    original_path = blob.key
+    content_hash = blob.content_hash
     
-    # Save original file
-    original_path = save_upload_file(file, upload_dir)
-    original_path = normalize_path(original_path)
-    
-    # Create processed path
-    file_ext = file.filename.split('.')[-1]
-    processed_filename = f"processed_{os.path.basename(original_path)}"
-    processed_path = normalize_path(os.path.join(processed_dir, processed_filename))
+    # Storage key of the processed image, its own even when the original is shared
+    processed_path = f"processed/{uuid4()}.{output_format(original_path)}"
     
     # Create image record
     image = Image(
@@ -53,10 +186,15 @@ async def upload_image(
         original_filename=file.filename,
         original_path=original_path,
         processed_path=processed_path,
+        content_hash=content_hash,
         filter_name=None,
         filter_value=None
     )
-    image.save()
+    await image_repository.insert(image)
+    
+    # Build the responsive variants ladder once the response is sent
+    if VARIANT_PREGENERATE:
+        background_tasks.add_task(pregenerate_variants, original_path, content_hash)
     
     logger.info(f"Image uploaded successfully: {file.filename} by the user: {current_user.email}")
     return {
@@ -64,6 +202,63 @@ async def upload_image(
         "image_id": str(image.id)
     }
 
+# Apply a filter to many images in the background
+@router.post("/batch", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(
+    request: Request,
+    batch_request: BatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    filter_name, filter_value = format_operations(batch_request.to_operations())
+    logger.info(f"Batch processing of {len(batch_request.image_ids)} images with filter {filter_name} by user: {current_user.email}")
+    job = await create_batch_job(str(current_user.id), batch_request.image_ids, filter_name, filter_value)
+    if job.status != BATCH_COMPLETED:
+        if PROCESSING_MODE == "queue":
+            await asyncio.to_thread(enqueue_batch_job, job)
+        else:
+            schedule_batch_job(job.id)
+    return {
+        "message": "Batch accepted",
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": str(request.url_for("get_batch", job_id=str(job.id)))
+    }
+
+# Progress and per image results of a batch
+@router.get("/batch/{job_id}")
+async def get_batch(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        job = await asyncio.to_thread(BatchJob.objects.get, id=job_id, user_id=str(current_user.id))
+    except (BatchJob.DoesNotExist, ValidationError):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch job not found"
+        )
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "filter": job.filter_name,
+        "filter_value": job.filter_value,
+        "total": job.total,
+        "completed": job.completed,
+        "failed": job.failed,
+        "progress": (job.completed + job.failed) / job.total if job.total else 1.0,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "items": [
+            {
+                "image_id": item.image_id,
+                "status": item.status,
+                "error": item.error,
+                "cache_hit": item.cache_hit
+            }
+            for item in job.items
+        ]
+    }
+
 # Process image
 @router.post("/{image_id}/process")
 async def process_image(
@@ -72,8 +267,9 @@ async def process_image(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        logger.info(f"Image processing attempt {image_id} with filter {filter_request.filter_name}")
-        image = Image.objects.get(id=image_id)
+        filter_name, filter_value = format_operations(filter_request.to_operations())
+        logger.info(f"Image processing attempt {image_id} with filter {filter_name}")
+        image = await image_repository.get_or_raise(image_id)
         
         # Verify ownership
         if str(image.user_id) != str(current_user.id):
@@ -83,21 +279,27 @@ async def process_image(
                 detail="Not authorized to process this image"
             )
         
-        # Normalize paths
-        original_path = normalize_path(image.original_path)
-        processed_path = normalize_path(image.processed_path)
-        
-        # Verify original image exists
-        if not os.path.exists(original_path):
-            logger.error(f"Original image not found in the path: {original_path}")
+        try:
+            cache_hit = await render_image(image, filter_name, filter_value)
+        except FileNotFoundError as e:
+            logger.error(f"Original image not found for image {image_id}: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Original image file not found at path: {original_path}"
+                detail=str(e)
+            )
+        except ExecutorSaturated:
+            logger.warning(f"Processing queue full, rejecting image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image processing is busy, try again later",
+                headers={"Retry-After": "5"}
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout processing image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Image processing timed out"
             )
-        
-        # Process image
-        try:
-            proccess_image(original_path, processed_path, filter_request.filter_name)
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             raise HTTPException(
@@ -105,22 +307,11 @@ async def process_image(
                 detail=f"Error processing image: {str(e)}"
             )
         
-        # Verify processed image was created
-        if not os.path.exists(processed_path):
-            logger.error(f"Error saving processed image to path: {processed_path}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error saving processed image at path: {processed_path}"
-            )
-        
-        # Update image record
-        image.filter_name = filter_request.filter_name
-        image.save()
-        
-        logger.info(f"Image {image_id} successfully processed with {filter_request.filter_name} filter")
+        logger.info(f"Image {image_id} successfully processed with {filter_name} filter (cache hit: {cache_hit})")
         return {
             "message": "Image processed successfully",
-            "filter": filter_request.filter_name
+            "filter": filter_name,
+            "filter_value": filter_value
         }
         
     except Image.DoesNotExist:
@@ -130,23 +321,87 @@ async def process_image(
             detail="Image not found"
         )
 
+# Quick low resolution render of a filter, nothing is saved on the image
+@router.post("/{image_id}/preview")
+async def preview_image(
+    image_id: str,
+    filter_request: FilterRequest,
+    request: Request,
+    size: int = Query(PREVIEW_DEFAULT_SIZE, ge=16, le=PREVIEW_MAX_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        filter_name, filter_value = format_operations(filter_request.to_operations())
+        logger.info(f"Image preview request {image_id} with filter {filter_name} by user: {current_user.email}")
+        image = await image_repository.get_or_raise(image_id)
+        
+        # Verify ownership
+        if str(image.user_id) != str(current_user.id):
+            logger.warning(f"Unauthorized image preview attempt {image_id} by user {current_user.email}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to access this image"
+            )
+        
+        try:
+            original_path = await original_file(image)
+        except BlobNotFound as e:
+            logger.error(f"Original image not found for preview of image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Original image file not found at path: {e.key}"
+            )
+        
+        fmt = negotiated_format(request, image)
+        try:
+            preview_path = await preview_filter(original_path, image.content_hash, filter_name, filter_value, size, fmt)
+        except ExecutorSaturated:
+            logger.warning(f"Processing queue full, rejecting preview of image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image processing is busy, try again later",
+                headers={"Retry-After": "5"}
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout rendering preview of image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Image processing timed out"
+            )
+        
+        return FileResponse(preview_path, media_type=mime_type(fmt), headers=vary_on_accept({}))
+        
+    except Image.DoesNotExist:
+        logger.warning(f"Attempt to preview non-existent image: {image_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+
 # Get user images
-@router.get("/", response_model=List[dict])
-async def get_user_images(current_user: User = Depends(get_current_user)):
+@router.get("/", response_model=List[dict], response_class=FastJSONResponse)
+async def get_user_images(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: SortOrder = DEFAULT_SORT,
+    filter_name: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     logger.info(f"Getting list of images for the user: {current_user.email}")
-    images = Image.objects(user_id=str(current_user.id))
-    return [
-        {
-            "id": str(img.id),
-            "original_filename": img.original_filename,
-            "original_path": img.original_path,
-            "processed_path": img.processed_path,
-            "filter_name": img.get_filter_name(),
-            "filter_value": img.get_filter_value(),
-            "uploaded_at": img.uploaded_at
-        }
-        for img in images
-    ]
+    query = image_repository.user_query(str(current_user.id), filter_name=filter_name)
+    # Raw documents with only the listed fields, mapped straight to the response
+    images, next_cursor = await paginate(
+        image_repository, query, cursor, limit, sort,
+        projection=image_repository.SUMMARY_FIELDS
+    )
+    response = FastJSONResponse([image_summary(raw) for raw in images])
+    
+    # The body stays a list, the next page is announced in the headers
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return response
 
 # Delete image
 @router.delete("/{image_id}")
@@ -156,7 +411,7 @@ async def delete_image(
 ):
     try:
         logger.info(f"Image deletion attempt {image_id} by user: {current_user.email}")
-        image = Image.objects.get(id=image_id)
+        image = await image_repository.get_or_raise(image_id)
         
         # Verify ownership
         if str(image.user_id) != str(current_user.id):
@@ -167,13 +422,11 @@ async def delete_image(
             )
         
         # Delete files
-        if os.path.exists(image.original_path):
-            os.remove(image.original_path)
-        if os.path.exists(image.processed_path):
-            os.remove(image.processed_path)
+        await asyncio.to_thread(release_blob, storage_key(image.original_path))
+        await asyncio.to_thread(storage.delete, storage_key(image.processed_path))
         
         # Delete record
-        image.delete()
+        await image_repository.delete(image)
         
         logger.info(f"Image {image_id} successfully removed")
         return {"message": "Image deleted successfully"}
@@ -188,11 +441,12 @@ async def delete_image(
 @router.get("/{image_id}/serve")
 async def serve_image(
     image_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     try:
-        logger.info(f"Image request {image_id} by user: {current_user.email}")
-        image = Image.objects.get(id=image_id)
+        access_logger.info("Image request %s by user: %s", image_id, current_user.email)
+        image = await image_repository.get_or_raise(image_id)
         
         # Verify ownership
         if str(image.user_id) != str(current_user.id):
@@ -202,19 +456,33 @@ async def serve_image(
                 detail="Not authorized to access this image"
             )
         
-        # Normalize paths
-        processed_path = normalize_path(image.processed_path)
-        original_path = normalize_path(image.original_path)
-        
-        # Check if processed file exists, if not use original
-        file_path = processed_path if os.path.exists(processed_path) else original_path
+        # Answer conditional requests before reading anything from disk
+        await ensure_content_hash(image)
+        fmt = negotiated_format(request, image)
+        etag, last_modified = image_validators(image, f"serve.{fmt}", fmt)
+        headers = vary_on_accept(cache_headers(etag, last_modified))
+        headers.pop("Accept-Ranges")
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(headers)
         
-        # Verify the file exists
-        if not os.path.exists(file_path):
-            logger.error(f"Image file not found in the path: {file_path}")
+        # Use the current derivative if there is one, if not use original
+        try:
+            file_path, is_original = await resolve_image_file(image)
+        except BlobNotFound as e:
+            logger.error(f"Image file not found in the path: {e.key}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Image file not found at path: {file_path}"
+                detail=f"Image file not found at path: {e.key}"
+            )
+        
+        try:
+            file_path = await encoded_file(image, file_path, is_original, None, fmt)
+        except ExecutorSaturated:
+            logger.warning(f"Processing queue full, rejecting image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image processing is busy, try again later",
+                headers={"Retry-After": "5"}
             )
         
         # Read the image file and convert to base64
@@ -227,15 +495,14 @@ async def serve_image(
                 detail=f"Error reading image file: {str(e)}"
             )
         
-        # Get the file extension to determine the MIME type
-        file_ext = image.original_filename.split('.')[-1].lower()
-        mime_type = f"image/{file_ext}"
-        
-        # Return the base64 image with its MIME type
-        return {
-            "image_data": f"data:{mime_type};base64,{encoded_string}",
-            "filename": image.original_filename
-        }
+        # Return the base64 image with the MIME type of what was encoded
+        return JSONResponse(
+            {
+                "image_data": f"data:{mime_type(fmt)};base64,{encoded_string}",
+                "filename": image.original_filename
+            },
+            headers=headers
+        )
         
     except Image.DoesNotExist:
         logger.warning(f"Attempt to access non-existent image: {image_id}")
@@ -248,11 +515,13 @@ async def serve_image(
 @router.get("/{image_id}/file")
 async def get_image_file(
     image_id: str,
+    request: Request,
+    original: bool = False,
     current_user: User = Depends(get_current_user)
 ):
     try:
-        logger.info(f"Image file request {image_id} by user: {current_user.email}")
-        image = Image.objects.get(id=image_id)
+        access_logger.info("Image file request %s by user: %s", image_id, current_user.email)
+        image = await image_repository.get_or_raise(image_id)
         
         # Verify ownership
         if str(image.user_id) != str(current_user.id):
@@ -262,22 +531,52 @@ async def get_image_file(
                 detail="Not authorized to access this image"
             )
         
-        # Check if processed file exists, if not use original
-        file_path = image.processed_path if os.path.exists(image.processed_path) else image.original_path
-        file_path = file_path.replace("\\", "/")
+        # Answer conditional requests before touching the file
+        # The original is sent as uploaded, the current image in the best format the client accepts
+        await ensure_content_hash(image)
+        fmt = normalize_format(output_format(storage_key(image.original_path))) if original else negotiated_format(request, image)
+        etag, last_modified = image_validators(image, f"file.{fmt}", fmt, original)
+        headers = cache_headers(etag, last_modified)
+        if not original:
+            vary_on_accept(headers)
+        if is_not_modified(request, etag, last_modified):
+            access_logger.info("Image file %s not modified", image_id)
+            return not_modified_response(headers)
         
-        if not os.path.exists(file_path):
-            logger.error(f"Image file not found in path: {file_path}")
+        # Use the current derivative if there is one, if not use original
+        try:
+            if original:
+                file_path, is_original = await original_file(image), True
+            else:
+                file_path, is_original = await resolve_image_file(image)
+        except BlobNotFound as e:
+            logger.error(f"Image file not found in path: {e.key}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Image file not found at path: {file_path}"
+                detail=f"Image file not found at path: {e.key}"
             )
         
-        logger.info(f"Image file {image_id} successfully sent")
-        return FileResponse(
+        filename = image.original_filename
+        if not original:
+            try:
+                file_path = await encoded_file(image, file_path, is_original, None, fmt)
+            except ExecutorSaturated:
+                logger.warning(f"Processing queue full, rejecting image file {image_id}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Image processing is busy, try again later",
+                    headers={"Retry-After": "5"}
+                )
+            if normalize_format(output_format(filename)) != fmt:
+                filename = f"{os.path.splitext(filename)[0]}.{fmt}"
+        
+        access_logger.info("Image file %s successfully sent", image_id)
+        return file_response(
+            request,
             file_path,
-            media_type=f"image/{image.original_filename.split('.')[-1].lower()}",
-            filename=image.original_filename
+            media_type=mime_type(fmt),
+            headers=headers,
+            filename=filename
         )
         
     except Image.DoesNotExist:
@@ -287,57 +586,151 @@ async def get_image_file(
             detail=f"Image with ID {image_id} not found in database"
         )
 
-@router.get("/original")
-async def get_original_images(current_user: User = Depends(get_current_user)):
+# Get a resized variant of the current image
+@router.get("/{image_id}/variant")
+async def get_image_variant(
+    image_id: str,
+    request: Request,
+    w: int,
+    fmt: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Without fmt the format is negotiated from the Accept header
+    negotiated = fmt is None
+    if negotiated:
+        candidates = [f for f in IMAGE_NEGOTIATE_FORMATS if f in VARIANT_FORMATS]
+        fmt = negotiate_format(request.headers.get("accept"), VARIANT_DEFAULT_FORMAT, candidates)
+    fmt = normalize_format(fmt)
+    if not is_allowed_variant(w, fmt):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Variant not allowed. Widths: {', '.join(map(str, VARIANT_WIDTHS))}; formats: {', '.join(sorted(VARIANT_FORMATS))}"
+        )
     try:
-        logger.info(f"Getting original images for user: {current_user.email}")
-        images = Image.objects(user_id=str(current_user.id))
-        
-        result = []
-        for img in images:
-            if os.path.exists(img.original_path):
-                with open(img.original_path, "rb") as image_file:
-                    encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                    file_ext = img.original_filename.split('.')[-1].lower()
-                    result.append({
-                        "id": str(img.id),
-                        "filename": img.original_filename,
-                        "image_data": f"data:image/{file_ext};base64,{encoded_string}",
-                        "uploaded_at": img.uploaded_at.strftime("%Y-%m-%d %H:%M:%S")
-                    })
-        
-        return {"images": result}
-    except Exception as e:
-        logger.error(f"Error getting original images: {str(e)}")
+        access_logger.info("Image variant request %s (%spx %s) by user: %s", image_id, w, fmt, current_user.email)
+        image = await image_repository.get_or_raise(image_id)
+        
+        # Verify ownership
+        if str(image.user_id) != str(current_user.id):
+            logger.warning(f"Unauthorized image variant access attempt {image_id} by user {current_user.email}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to access this image"
+            )
+        
+        await ensure_content_hash(image)
+        etag, last_modified = image_validators(image, f"variant-{w}.{fmt}", fmt)
+        headers = cache_headers(etag, last_modified)
+        if negotiated:
+            vary_on_accept(headers)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(headers)
+        
+        # Variants are made from the current derivative, if not from the original
+        try:
+            source_path, is_original = await resolve_image_file(image)
+        except BlobNotFound as e:
+            logger.error(f"Image file not found in path: {e.key}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Image file not found at path: {e.key}"
+            )
+        
+        try:
+            variant_path = await encoded_file(image, source_path, is_original, w, fmt)
+        except ExecutorSaturated:
+            logger.warning(f"Processing queue full, rejecting variant of image {image_id}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image processing is busy, try again later",
+                headers={"Retry-After": "5"}
+            )
+        
+        return file_response(request, variant_path, media_type=mime_type(fmt), headers=headers)
+        
+    except Image.DoesNotExist:
+        logger.warning(f"Attempt to access non-existent image variant: {image_id}")
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error getting original images"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Image with ID {image_id} not found in database"
         )
 
+# Metadata of the user images with URLs to fetch each file
+@router.get("/manifest")
+async def get_images_manifest(
+    request: Request,
+    kind: Literal["original", "processed"] = "original",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: SortOrder = DEFAULT_SORT,
+    filter_name: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    logger.info(f"Getting {kind} images manifest for user: {current_user.email}")
+    images, next_cursor = await paginate(image_repository, gallery_query(current_user, kind, filter_name), cursor, limit, sort)
+
+    result = []
+    for img in images:
+        url = request.url_for("get_image_file", image_id=str(img.id))
+        if kind == "original":
+            url = url.include_query_params(original="true")
+        result.append({
+            "id": str(img.id),
+            "filename": img.original_filename,
+            "mime_type": image_mime_type(img.original_filename),
+            "filter_name": img.get_filter_name(),
+            "uploaded_at": img.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "url": str(url)
+        })
+    return {"images": result, "next_cursor": next_cursor}
+
+@router.get("/original")
+async def get_original_images(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: SortOrder = DEFAULT_SORT,
+    filter_name: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    current_user: User = Depends(get_current_user)
+):
+    logger.info(f"Getting original images for user: {current_user.email}")
+    images, next_cursor = await paginate(image_repository, gallery_query(current_user, "original", filter_name), cursor, limit, sort)
+    entries = [
+        (
+            {
+                "id": str(img.id),
+                "filename": img.original_filename,
+                "uploaded_at": img.uploaded_at.strftime("%Y-%m-%d %H:%M:%S")
+            },
+            storage_key(img.original_path),
+            image_mime_type(img.original_filename)
+        )
+        for img in images
+    ]
+    return gallery_response(entries, next_cursor, format)
+
 @router.get("/processed")
-async def get_processed_images(current_user: User = Depends(get_current_user)):
-    try:
-        logger.info(f"Getting processed images for user: {current_user.email}")
-        images = Image.objects(user_id=str(current_user.id))
-        
-        result = []
-        for img in images:
-            if os.path.exists(img.processed_path):
-                with open(img.processed_path, "rb") as image_file:
-                    encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                    file_ext = img.original_filename.split('.')[-1].lower()
-                    result.append({
-                        "id": str(img.id),
-                        "filename": img.original_filename,
-                        "image_data": f"data:image/{file_ext};base64,{encoded_string}",
-                        "filter_name": img.filter_name,
-                        "uploaded_at": img.uploaded_at.strftime("%Y-%m-%d %H:%M:%S")
-                    })
-        
-        return {"images": result}
-    except Exception as e:
-        logger.error(f"Error getting processed images: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error getting processed images"
-        )
\ No newline at end of file
+async def get_processed_images(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: SortOrder = DEFAULT_SORT,
+    filter_name: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    current_user: User = Depends(get_current_user)
+):
+    logger.info(f"Getting processed images for user: {current_user.email}")
+    images, next_cursor = await paginate(image_repository, gallery_query(current_user, "processed", filter_name), cursor, limit, sort)
+    entries = [
+        (
+            {
+                "id": str(img.id),
+                "filename": img.original_filename,
+                "filter_name": img.filter_name,
+                "uploaded_at": img.uploaded_at.strftime("%Y-%m-%d %H:%M:%S")
+            },
+            storage_key(img.processed_path),
+            image_mime_type(img.original_filename)
+        )
+        for img in images
+    ]
+    return gallery_response(entries, next_cursor, format)
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import uuid4
+
+from bson import ObjectId
+from mongoengine.queryset.visitor import Q
+
+from app.config import BATCH_CONCURRENCY, BATCH_STALE_SECONDS
+from app.models.batch import (
+    BatchJob,
+    BatchItem,
+    BATCH_PENDING,
+    BATCH_RUNNING,
+    BATCH_COMPLETED,
+    ITEM_PENDING,
+    ITEM_DONE,
+    ITEM_FAILED,
+)
+from app.models.images import Image
+from app.repositories import image_repository
+from app.services.executor import ExecutorSaturated, WorkerCrashed
+from app.services.processing import render_image
+from app.services.job_queue import enqueue, register_handler
+from app.models.job import Job
+
+logger = logging.getLogger("images")
+
+# Identifies this process as the owner of the jobs it runs
+INSTANCE_ID = str(uuid4())
+# Owner of batches whose items were handed to the job queue
+QUEUE_OWNER = "queue"
+SATURATED_RETRY_SECONDS = 1.0
+
+# Keep references so running jobs are not garbage collected
+_running_tasks = set()
+
+
+async def create_batch_job(user_id: str, image_ids: List[str], filter_name: str, filter_value: Optional[str]) -> BatchJob:
+    image_ids = list(dict.fromkeys(image_ids))
+    valid_ids = [ObjectId(i) for i in image_ids if ObjectId.is_valid(i)]
+    owned = set(await image_repository.owned_ids(user_id, valid_ids))
+
+    # Images that are missing or belong to someone else fail right away
+    now = datetime.now()
+    items = [
+        BatchItem(image_id=i)
+        if i in owned
+        else BatchItem(image_id=i, status=ITEM_FAILED, error="Image not found", finished_at=now)
+        for i in image_ids
+    ]
+    failed = len(image_ids) - len(owned)
+    job = BatchJob(
+        user_id=user_id,
+        filter_name=filter_name,
+        filter_value=filter_value,
+        total=len(items),
+        failed=failed,
+        items=items,
+        status=BATCH_COMPLETED if failed == len(items) else BATCH_PENDING,
+        finished_at=now if failed == len(items) else None,
+    )
+    await asyncio.to_thread(job.save)
+    return job
+
+
+def stale_batch_jobs() -> Q:
+    """Pending jobs, and running ones whose owner went quiet. Never the jobs this process runs."""
+    stale_before = datetime.now() - timedelta(seconds=BATCH_STALE_SECONDS)
+    return Q(status=BATCH_PENDING) | Q(
+        status=BATCH_RUNNING, heartbeat_at__lt=stale_before, owner__nin=[QUEUE_OWNER, INSTANCE_ID]
+    )
+
+
+def claim_batch_job(job_id) -> Optional[BatchJob]:
+    """Atomically take a pending job, or a running one whose owner went quiet."""
+    return BatchJob.objects(Q(id=job_id) & stale_batch_jobs()).modify(
+        new=True,
+        set__status=BATCH_RUNNING,
+        set__owner=INSTANCE_ID,
+        set__heartbeat_at=datetime.now(),
+    )
+
+
+def record_batch_item(job_id, image_id: str, error: Optional[str] = None, cache_hit: Optional[bool] = None) -> bool:
+    """Store the result of one item, only once. Returns False if it was already recorded."""
+    # Progress is written per item so it survives a restart
+    now = datetime.now()
+    update = {
+        "set__items__S__status": ITEM_FAILED if error else ITEM_DONE,
+        "set__items__S__error": error,
+        "set__items__S__cache_hit": cache_hit,
+        "set__items__S__finished_at": now,
+        "set__heartbeat_at": now,
+        "set__updated_at": now,
+    }
+    update["inc__failed" if error else "inc__completed"] = 1
+    updated = BatchJob.objects(
+        id=job_id, items__match={"image_id": image_id, "status": ITEM_PENDING}
+    ).update_one(**update)
+    if error:
+        logger.warning(f"Batch {job_id}: image {image_id} failed: {error}")
+    return bool(updated)
+
+
+def touch_batch_job(job_id) -> None:
+    BatchJob.objects(id=job_id, status=BATCH_RUNNING, owner=INSTANCE_ID).update_one(set__heartbeat_at=datetime.now())
+
+
+async def heartbeat_batch_job(job_id):
+    # Items waiting on a full executor or a slow render record nothing,
+    # keep the claim fresh so no other instance takes the job meanwhile
+    while True:
+        await asyncio.sleep(BATCH_STALE_SECONDS / 3)
+        try:
+            await asyncio.to_thread(touch_batch_job, job_id)
+        except Exception as e:
+            logger.error(f"Error refreshing the heartbeat of batch {job_id}: {str(e)}")
+
+
+def finish_batch_job_if_done(job_id) -> bool:
+    job = BatchJob.objects(id=job_id).only("completed", "failed", "total", "status").first()
+    if job is None or job.status == BATCH_COMPLETED or job.completed + job.failed < job.total:
+        return False
+    now = datetime.now()
+    BatchJob.objects(id=job_id, status__ne=BATCH_COMPLETED).update_one(
+        set__status=BATCH_COMPLETED,
+        set__finished_at=now,
+        set__updated_at=now,
+    )
+    logger.info(f"Batch {job_id} finished: {job.completed} done, {job.failed} failed")
+    return True
+
+
+async def process_batch_item(job: BatchJob, image_id: str, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        error = None
+        cache_hit = None
+        try:
+            image = await image_repository.get(image_id)
+            if image is None or image.user_id != job.user_id:
+                raise Image.DoesNotExist
+            while True:
+                try:
+                    cache_hit = await render_image(image, job.filter_name, job.filter_value)
+                    break
+                except WorkerCrashed:
+                    # The image may be what kills the worker, do not retry it
+                    raise
+                except ExecutorSaturated:
+                    # Interactive requests fill the pool first, wait for room
+                    await asyncio.sleep(SATURATED_RETRY_SECONDS)
+        except Image.DoesNotExist:
+            error = "Image not found"
+        except asyncio.TimeoutError:
+            error = "Image processing timed out"
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        await asyncio.to_thread(record_batch_item, job.id, image_id, error, cache_hit)
+
+
+async def run_batch_job(job_id):
+    job = await asyncio.to_thread(claim_batch_job, job_id)
+    if job is None:
+        return
+    logger.info(f"Running batch {job.id} with {job.total} images and filter {job.filter_name}")
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    pending = [item.image_id for item in job.items if item.status == ITEM_PENDING]
+    heartbeat = asyncio.create_task(heartbeat_batch_job(job.id))
+    try:
+        await asyncio.gather(*(process_batch_item(job, image_id, semaphore) for image_id in pending))
+    finally:
+        heartbeat.cancel()
+    await asyncio.to_thread(finish_batch_job_if_done, job.id)
+
+
+def schedule_batch_job(job_id):
+    task = asyncio.create_task(run_batch_job(job_id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+
+
+def resumable_batch_job_ids() -> list:
+    return list(BatchJob.objects(stale_batch_jobs()).scalar("id"))
+
+
+async def resume_batch_jobs():
+    # Jobs interrupted by a restart continue where they left off
+    jobs = await asyncio.to_thread(resumable_batch_job_ids)
+    for job_id in jobs:
+        schedule_batch_job(job_id)
+    return len(jobs)
+
+
+async def watch_batch_jobs():
+    # Picks up jobs left behind by instances that stopped, claims are atomic
+    # so several instances can watch at the same time
+    while True:
+        try:
+            resumed = await resume_batch_jobs()
+            if resumed:
+                logger.info(f"Resumed {resumed} batch jobs")
+        except Exception as e:
+            logger.error(f"Error resuming batch jobs: {str(e)}")
+        await asyncio.sleep(BATCH_STALE_SECONDS / 2)
+
+
+# Queue mode: every item is a job for `python -m app.worker`
+
+BATCH_ITEM_JOB = "batch_item"
+
+
+def enqueue_batch_job(job: BatchJob) -> int:
+    pending = [item.image_id for item in job.items if item.status == ITEM_PENDING]
+    for image_id in pending:
+        enqueue(BATCH_ITEM_JOB, {"batch_job_id": str(job.id), "image_id": image_id})
+    BatchJob.objects(id=job.id).update_one(
+        set__status=BATCH_RUNNING,
+        set__owner=QUEUE_OWNER,
+        set__heartbeat_at=datetime.now(),
+    )
+    return len(pending)
+
+
+async def handle_batch_item(queue_job: Job):
+    batch_job_id = queue_job.payload["batch_job_id"]
+    image_id = queue_job.payload["image_id"]
+    batch = await asyncio.to_thread(BatchJob.objects(id=batch_job_id).first)
+    if batch is None:
+        return {"error": "Batch job not found"}
+
+    # Errors that will not go away are recorded, anything else is retried
+    try:
+        image = await image_repository.get(image_id)
+        if image is None or image.user_id != batch.user_id:
+            raise Image.DoesNotExist
+        cache_hit = await render_image(image, batch.filter_name, batch.filter_value)
+    except (Image.DoesNotExist, FileNotFoundError) as e:
+        error = "Image not found" if isinstance(e, Image.DoesNotExist) else str(e)
+        await asyncio.to_thread(record_batch_item, batch.id, image_id, error)
+        await asyncio.to_thread(finish_batch_job_if_done, batch.id)
+        return {"error": error}
+
+    await asyncio.to_thread(record_batch_item, batch.id, image_id, None, cache_hit)
+    await asyncio.to_thread(finish_batch_job_if_done, batch.id)
+    return {"cache_hit": cache_hit}
+
+
+def give_up_batch_item(queue_job: Job, error: str):
+    batch_job_id = queue_job.payload["batch_job_id"]
+    record_batch_item(batch_job_id, queue_job.payload["image_id"], error=error)
+    finish_batch_job_if_done(batch_job_id)
+
+
+register_handler(BATCH_ITEM_JOB, handle_batch_item, give_up_batch_item)
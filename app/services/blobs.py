@@ -0,0 +1,71 @@
+import logging
+import os
+from datetime import datetime
+from uuid import uuid4
+
+from mongoengine.errors import NotUniqueError
+from pymongo.errors import DuplicateKeyError
+
+from app.models.blob import Blob
+from app.services.storage import SpooledUpload
+from app.storage import storage
+
+logger = logging.getLogger("images")
+
+# Extension of the stored originals, by sniffed format
+FORMAT_EXTENSIONS = {"jpeg": "jpg", "png": "png"}
+
+
+def acquire_blob(upload: SpooledUpload) -> Blob:
+    """
+    Take a reference to the blob holding these bytes, storing the spooled
+    upload only when no other image has the same content. The spool file
+    is always consumed.
+    """
+    now = datetime.now()
+    ext = FORMAT_EXTENSIONS.get(upload.format, upload.format)
+    try:
+        for attempt in range(2):
+            try:
+                # Each incarnation of a blob gets its own key, so a delete racing
+                # with a new upload of the same bytes never removes the new file
+                blob = Blob.objects(content_hash=upload.sha256).modify(
+                    upsert=True,
+                    new=True,
+                    inc__refcount=1,
+                    set__updated_at=now,
+                    set_on_insert__key=f"original/{upload.sha256}-{uuid4().hex[:8]}.{ext}",
+                    set_on_insert__size=upload.size,
+                    set_on_insert__format=upload.format,
+                    set_on_insert__created_at=now,
+                )
+                break
+            except (NotUniqueError, DuplicateKeyError):
+                # A concurrent upload of the same bytes created it first
+                if attempt:
+                    raise
+
+        # Writing identical bytes again is harmless, it covers a first
+        # uploader that has not finished storing the file yet
+        if blob.refcount == 1 or not storage.exists(blob.key):
+            storage.put_file(blob.key, upload.path)
+        else:
+            logger.info(f"Upload deduplicated, blob {blob.key} has {blob.refcount} references")
+    finally:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+    return blob
+
+
+def release_blob(key: str) -> bool:
+    """Drop one reference to a stored original. Returns True when the file was deleted."""
+    blob = Blob.objects(key=key).modify(new=True, dec__refcount=1, set__updated_at=datetime.now())
+    if blob is None:
+        # Originals stored before deduplication belong to a single image
+        return storage.delete(key)
+    if blob.refcount > 0:
+        return False
+    # Only the one who removes the document removes the file
+    if not Blob.objects(id=blob.id, refcount__lte=0).delete():
+        return False
+    return storage.delete(key)
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from uuid import uuid4
+
+from app.config import (
+    DERIVATIVE_CACHE_DIR,
+    DERIVATIVE_CACHE_MAX_BYTES,
+    DERIVATIVE_CACHE_PIN_SECONDS,
+    DERIVATIVE_CACHE_RESCAN_SECONDS,
+)
+from app.services.encoding import encoder_signature
+
+
+def link_or_copy(source_path: str, dest_path: str) -> None:
+    # A hard link costs no copy, some filesystems do not have them
+    try:
+        os.link(source_path, dest_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source_path, dest_path)
+
+
+class DerivativeCache:
+    """
+    On disk cache of processed images.
+
+    Entries are keyed by the hash of the original bytes plus the filter and
+    output format, so the same result is never rendered twice. The total
+    size is bounded and the least recently used files are evicted first.
+
+    Several workers can share the directory: each one rescans it every
+    rescan_seconds, so max_bytes holds for all of them, and the paths it
+    hands out are pinned (see pin()) so an eviction by any of them does
+    not break a response that is being served.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        pin_seconds: int = DERIVATIVE_CACHE_PIN_SECONDS,
+        rescan_seconds: int = DERIVATIVE_CACHE_RESCAN_SECONDS,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pin_seconds = pin_seconds
+        self.rescan_seconds = rescan_seconds
+        self._pin_dir = os.path.join(directory, ".pins")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # filename -> size
+        self._size = 0
+        self._loaded = False
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        filter_name: Optional[str],
+        filter_value: Optional[str],
+        fmt: str,
+        width: Optional[int] = None,
+        preview: Optional[int] = None,
+    ) -> str:
+        parts = [content_hash, filter_name or "", filter_value or "", fmt.lower()]
+        if width is not None:
+            parts.append(f"w{width}")
+        if preview is not None:
+            parts.append(f"p{preview}")
+        if filter_name or width is not None or preview is not None:
+            # Rendered, not the uploaded bytes: depends on the encoder settings too
+            parts.append(encoder_signature(fmt))
+        raw = "|".join(parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _filename(self, key: str, fmt: str) -> str:
+        return f"{key}.{fmt.lower()}"
+
+    def _scan(self) -> None:
+        # Rebuild the LRU order from what is on disk, oldest first. Other
+        # workers share the directory, so this also counts their files
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries.clear()
+        self._size = 0
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+        self._loaded = True
+        self._scanned_at = time.monotonic()
+
+    def _load(self) -> None:
+        if not self._loaded:
+            self._scan()
+
+    def _lookup(self, name: str) -> Optional[str]:
+        """Path of a cached file, also one another worker wrote. Call with the lock held."""
+        path = os.path.join(self.directory, name)
+        try:
+            # mtime is the LRU order other workers see on their next scan
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Another worker evicted it
+            if name in self._entries:
+                self._size -= self._entries.pop(name)
+            return None
+        if name not in self._entries:
+            self._size += size
+        self._entries[name] = size
+        self._entries.move_to_end(name)
+        return path
+
+    def _pin_path(self, fmt: str) -> str:
+        # Creation time in the name, the link shares the mtime of the entry
+        os.makedirs(self._pin_dir, exist_ok=True)
+        return os.path.join(self._pin_dir, f"{int(time.time())}-{uuid4().hex}.{fmt.lower()}")
+
+    def pin(self, key: str, fmt: str) -> Optional[str]:
+        """
+        Path of the cached file for a key, or None on a miss. The path is a
+        hard link of its own that stays valid for pin_seconds, even if the
+        entry is evicted meanwhile, so it can be handed to Pillow or to a
+        FileResponse that opens it later.
+        """
+        with self._lock:
+            self._load()
+            path = self._lookup(self._filename(key, fmt))
+            pin_path = None
+            if path:
+                pin_path = self._pin_path(fmt)
+                try:
+                    link_or_copy(path, pin_path)
+                except FileNotFoundError:
+                    pin_path = None
+            if pin_path is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return pin_path
+
+    def get_into(self, key: str, fmt: str, dest_path: str) -> bool:
+        """
+        Copy the cached file for a key to dest_path. Returns False on a miss.
+        The copy happens under the lock, so a concurrent put cannot evict
+        the file halfway.
+        """
+        with self._lock:
+            self._load()
+            path = self._lookup(self._filename(key, fmt))
+            if path:
+                try:
+                    shutil.copyfile(path, dest_path)
+                except FileNotFoundError:
+                    path = None
+            if path is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+
+    def temp_path(self, fmt: str) -> str:
+        """A path inside the cache directory to render into before put(move=True)."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".{uuid4()}.{fmt.lower()}")
+
+    def put(self, key: str, fmt: str, source_path: str, move: bool = False) -> str:
+        """Copy (or move) a rendered file into the cache and return a pinned path to it, see pin()."""
+        name = self._filename(key, fmt)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if not self._loaded or time.monotonic() - self._scanned_at >= self.rescan_seconds:
+                self._scan()
+                self._reap_pins()
+            if move:
+                tmp_path = source_path
+            else:
+                tmp_path = os.path.join(self.directory, f".{uuid4()}.tmp")
+                shutil.copyfile(source_path, tmp_path)
+            # Pinned before it is visible, so no eviction can get in between
+            pin_path = self._pin_path(fmt)
+            link_or_copy(tmp_path, pin_path)
+            os.replace(tmp_path, path)
+
+            size = os.path.getsize(path)
+            if name in self._entries:
+                self._size -= self._entries.pop(name)
+            self._entries[name] = size
+            self._size += size
+            self._evict()
+        return pin_path
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _reap_pins(self) -> None:
+        expired_before = time.time() - self.pin_seconds
+        try:
+            names = os.listdir(self._pin_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            created, _, _ = name.partition("-")
+            if created.isdigit() and int(created) < expired_before:
+                try:
+                    os.remove(os.path.join(self._pin_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+derivative_cache = DerivativeCache(DERIVATIVE_CACHE_DIR, DERIVATIVE_CACHE_MAX_BYTES)
@@ -0,0 +1,101 @@
+from typing import List, Optional
+from PIL import Image
+
+from app.config import (
+    IMAGE_NEGOTIATE_FORMATS,
+    JPEG_QUALITY,
+    WEBP_QUALITY,
+    WEBP_METHOD,
+    AVIF_QUALITY,
+    AVIF_SPEED,
+)
+
+try:
+    # Optional, registers an AVIF encoder with Pillow
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+def normalize_format(fmt: str) -> str:
+    fmt = fmt.lower().lstrip(".")
+    return FORMAT_ALIASES.get(fmt, fmt)
+
+
+def mime_type(fmt: str) -> str:
+    return f"image/{normalize_format(fmt)}"
+
+
+def pil_format(fmt: str) -> Optional[str]:
+    # Pillow format name of an extension, None when there is no encoder for it
+    Image.init()
+    name = Image.registered_extensions().get(f".{normalize_format(fmt)}")
+    return name if name in Image.SAVE else None
+
+
+def is_supported(fmt: str) -> bool:
+    return pil_format(fmt) is not None
+
+
+def encoder_options(fmt: str) -> dict:
+    # Quality and effort of each encoder, see the JPEG_/WEBP_/AVIF_ settings
+    fmt = normalize_format(fmt)
+    if fmt == "jpeg":
+        return {"quality": JPEG_QUALITY}
+    if fmt == "webp":
+        return {"quality": WEBP_QUALITY, "method": WEBP_METHOD}
+    if fmt == "avif":
+        return {"quality": AVIF_QUALITY, "speed": AVIF_SPEED}
+    return {}
+
+
+def encoder_signature(fmt: str) -> str:
+    """
+    The encoder settings of fmt as text, part of the cache keys and ETags
+    of everything encoded with them, so changing a setting is never served
+    stale bytes.
+    """
+    return ",".join(f"{name}={value}" for name, value in sorted(encoder_options(fmt).items()))
+
+
+def save_image(image: Image.Image, output_path: str, fmt: str):
+    fmt = normalize_format(fmt)
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(output_path, format=pil_format(fmt), **encoder_options(fmt))
+
+
+def parse_accept(accept: Optional[str]) -> dict:
+    """Media ranges of an Accept header with their q values."""
+    ranges = {}
+    for part in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges[media_type.lower()] = q
+    return ranges
+
+
+def negotiate_format(accept: Optional[str], fallback: str, candidates: Optional[List[str]] = None) -> str:
+    """
+    Best of the candidate formats the client lists explicitly in Accept, or
+    fallback. Wildcards are not enough, browsers send */* for images even
+    when they can not decode every format.
+    """
+    ranges = parse_accept(accept)
+    best, best_q = normalize_format(fallback), 0.0
+    for fmt in candidates if candidates is not None else IMAGE_NEGOTIATE_FORMATS:
+        q = ranges.get(mime_type(fmt), 0.0)
+        if q > best_q and is_supported(fmt):
+            best, best_q = normalize_format(fmt), q
+    return best
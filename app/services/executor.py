@@ -0,0 +1,154 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple, Union
+
+from app.config import (
+    PROCESSING_WORKERS_PER_CORE,
+    PROCESSING_MAX_WORKERS,
+    PROCESSING_QUEUE_SIZE,
+    PROCESSING_TASK_TIMEOUT,
+    PROCESSING_MAX_TASKS_PER_CHILD,
+)
+from app.utils.metrics import count_pillow_time
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the processing queue is full and the task was not accepted."""
+
+
+class WorkerCrashed(ExecutorSaturated):
+    """
+    Raised when a pool worker died (OOM kill, decoder crash) with the task
+    in flight. The pool is rebuilt, so the request can be retried.
+    """
+
+
+def run_timed(fn: Callable, *args: Any) -> Tuple[Any, float]:
+    # Runs in the worker, so the time excludes the wait in the queue
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def pool_size() -> int:
+    """Number of worker processes for this host, from the per core setting."""
+    size = max(1, int((os.cpu_count() or 1) * PROCESSING_WORKERS_PER_CORE))
+    if PROCESSING_MAX_WORKERS > 0:
+        size = min(size, PROCESSING_MAX_WORKERS)
+    return size
+
+
+class ProcessingExecutor:
+    """
+    Runs CPU bound image work outside of the event loop.
+
+    Tasks go to a process pool whose workers are recycled after
+    `max_tasks_per_child` tasks. At most `workers + queue_size` tasks can be
+    in flight; anything beyond that is rejected with ExecutorSaturated so
+    callers can answer 503 instead of piling up requests. A task that times
+    out keeps its slot until it actually ends, and a pool broken by a dead
+    worker is replaced by a new one.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        task_timeout: float,
+        max_tasks_per_child: int,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.task_timeout = task_timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._pool: Optional[Union[ProcessPoolExecutor, ThreadPoolExecutor]] = None
+        self._pending = 0
+
+    @property
+    def inline(self) -> bool:
+        # Workers <= 0 runs tasks in a thread, handy for local development
+        return self.workers <= 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.queue_size
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        if self.inline:
+            self._pool = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix="processing")
+            return
+        # Worker recycling is not supported with the "fork" start method
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=self.max_tasks_per_child or None,
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _discard_pool(self, pool) -> None:
+        # Only once, every task that was in the broken pool ends up here
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        if self._pending >= self.capacity:
+            raise ExecutorSaturated("Image processing queue is full")
+
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            self.start()
+        pool = self._pool
+        try:
+            future: Future = pool.submit(run_timed, fn, *args)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise WorkerCrashed("Image processing worker crashed")
+
+        # The slot is given back when the task ends in the pool, not when
+        # the caller stops waiting, so timed out tasks still count
+        self._pending += 1
+        future.add_done_callback(lambda _: self._task_done(loop))
+        try:
+            # On timeout a task still waiting in the queue is cancelled,
+            # a running one keeps its worker busy until it ends
+            result, seconds = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.task_timeout or None
+            )
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise WorkerCrashed("Image processing worker crashed")
+        count_pillow_time(seconds)
+        return result
+
+    def _task_done(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called from a pool thread
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop is closed, nobody is counting anymore
+            pass
+
+    def _release(self) -> None:
+        self._pending -= 1
+
+processing_executor = ProcessingExecutor(
+    workers=-1 if PROCESSING_MAX_WORKERS < 0 else pool_size(),
+    queue_size=PROCESSING_QUEUE_SIZE,
+    task_timeout=PROCESSING_TASK_TIMEOUT,
+    max_tasks_per_child=PROCESSING_MAX_TASKS_PER_CHILD,
+)
@@ -0,0 +1,104 @@
+import functools
+from typing import Optional
+import numpy as np
+from PIL import Image, ImageFilter
+
+DEFAULT_BRIGHTNESS = 1.5
+DEFAULT_THUMBNAIL_SIZE = 100
+SEPIA_TONE = (255, 240, 192)
+
+# Accepted range of filter_value for the parametric filters
+PARAMETER_RANGES = {
+    "brightness": (0.0, 10.0),
+    "blur": (0.1, 50.0),
+    "thumbnail": (1.0, 4096.0),
+}
+
+# ITU-R 601 weights in 16 bit fixed point, as used by convert("L")
+LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.int64)
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    # Tables are cached and shared, nobody may write into them
+    array.setflags(write=False)
+    return array
+
+
+IDENTITY_LUT = _frozen(np.arange(256, dtype=np.uint8))
+
+
+def validate_parameter(name: str, value: Optional[float]) -> None:
+    if value is None or name not in PARAMETER_RANGES:
+        return
+    low, high = PARAMETER_RANGES[name]
+    if not low <= value <= high:
+        raise ValueError(f"Value for {name} must be between {low:g} and {high:g}")
+
+
+@functools.lru_cache(maxsize=None)
+def invert_lut() -> np.ndarray:
+    return _frozen(255 - np.arange(256, dtype=np.uint8))
+
+
+@functools.lru_cache(maxsize=256)
+def brightness_lut(factor: float) -> np.ndarray:
+    # Same truncation as ImageEnhance.Brightness, which blends with black
+    values = (np.arange(256, dtype=np.float64) * factor).astype(np.int64)
+    return _frozen(np.clip(values, 0, 255).astype(np.uint8))
+
+
+@functools.lru_cache(maxsize=None)
+def sepia_palette() -> np.ndarray:
+    # Gray value blended 50% with the sepia tone, one column per band
+    gray = np.arange(256, dtype=np.float64)[:, None]
+    tone = np.array(SEPIA_TONE, dtype=np.float64)[None, :]
+    return _frozen((gray + 0.5 * (tone - gray)).astype(np.uint8))
+
+
+def compose_lut(first: np.ndarray, then: np.ndarray) -> np.ndarray:
+    """Table equivalent to applying `first` and then `then`, also for (256, 3) palettes."""
+    return then[first]
+
+
+def luma_lut(palette: np.ndarray) -> np.ndarray:
+    """Gray value of each palette entry, as convert("L") would compute it."""
+    return ((palette.astype(np.int64) @ LUMA_WEIGHTS + 0x8000) >> 16).astype(np.uint8)
+
+
+def is_identity(lut: np.ndarray) -> bool:
+    return lut is IDENTITY_LUT or np.array_equal(lut, IDENTITY_LUT)
+
+
+def apply_lut(image: Image.Image, lut: np.ndarray, alpha_lut: np.ndarray = IDENTITY_LUT) -> Image.Image:
+    # One pass in C over every band, the alpha band has its own table
+    table = []
+    for band in image.getbands():
+        table += (alpha_lut if band == "A" else lut).tolist()
+    return image.point(table)
+
+
+def apply_palette(image: Image.Image, palette: np.ndarray) -> Image.Image:
+    """
+    Map an L image through a (256, 3) table straight into an RGB image.
+    The table becomes the palette of the gray image, so the expansion to
+    RGB is a single pass in C (about 10x faster than indexing in NumPy).
+    An L image is reused in place, so callers must own it.
+    """
+    mapped = image.convert("L") if image.mode != "L" else image
+    mapped.putpalette(palette.tobytes())
+    return mapped.convert("RGB")
+
+
+def grayscale(image: Image.Image) -> Image.Image:
+    return image.convert("L")
+
+
+def blur(image: Image.Image, radius: Optional[float] = None) -> Image.Image:
+    if radius is None:
+        return image.filter(ImageFilter.BLUR)
+    return image.filter(ImageFilter.GaussianBlur(radius))
+
+
+def thumbnail(image: Image.Image, size: int = DEFAULT_THUMBNAIL_SIZE) -> Image.Image:
+    image.thumbnail((size, size))
+    return image
@@ -0,0 +1,57 @@
+import base64
+import json
+from typing import Iterable, Iterator, List, Optional
+from app.storage import storage
+
+# Multiple of 3 so each chunk encodes to base64 without padding
+B64_CHUNK_SIZE = 48 * 1024
+
+def image_mime_type(filename: str) -> str:
+    file_ext = filename.split('.')[-1].lower()
+    if file_ext == "jpg":
+        file_ext = "jpeg"
+    return f"image/{file_ext}"
+
+def stream_base64_entry(fields: dict, key: str, mime_type: str) -> Iterator[bytes]:
+    """
+    Yield one JSON object with the stored file inlined as a base64 data URL.
+    The file is read and encoded chunk by chunk, never as a whole.
+    """
+    head = json.dumps(fields, default=str)[:-1]
+    separator = ", " if fields else ""
+    yield f'{head}{separator}"image_data": "data:{mime_type};base64,'.encode("utf-8")
+    # Backends return chunks of any size, carry the bytes that do not make a
+    # multiple of 3 so no padding ends up in the middle
+    pending = b""
+    for chunk in storage.stream(key):
+        pending += chunk
+        if len(pending) >= B64_CHUNK_SIZE:
+            cut = len(pending) - len(pending) % 3
+            yield base64.b64encode(pending[:cut])
+            pending = pending[cut:]
+    yield base64.b64encode(pending)
+    yield b'"}'
+
+def stream_gallery_json(entries: Iterable[tuple], next_cursor: Optional[str]) -> Iterator[bytes]:
+    # {"images": [...], "next_cursor": ...} written one image at a time
+    yield b'{"images": ['
+    first = True
+    for fields, key, mime_type in entries:
+        if not first:
+            yield b", "
+        first = False
+        yield from stream_base64_entry(fields, key, mime_type)
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'.encode("utf-8")
+
+def stream_gallery_ndjson(entries: Iterable[tuple], next_cursor: Optional[str]) -> Iterator[bytes]:
+    # One image per line, the last line carries the cursor of the next page
+    for fields, key, mime_type in entries:
+        yield from stream_base64_entry(fields, key, mime_type)
+        yield b"\n"
+    yield json.dumps({"next_cursor": next_cursor}).encode("utf-8") + b"\n"
+
+def existing_entries(entries: List[tuple]) -> Iterator[tuple]:
+    # Checked lazily so files deleted while streaming are skipped
+    for fields, key, mime_type in entries:
+        if storage.exists(key):
+            yield fields, key, mime_type
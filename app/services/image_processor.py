@@ -1,33 +1,100 @@
-from PIL import Image, ImageFilter, ImageEnhance
+import asyncio
+import os
+from typing import Optional, Tuple
+from PIL import Image
+from app.services.pipeline import parse_operations, run_pipeline
+from app.services.encoding import save_image
 
 
-def proccess_image(file_path: str, output_path: str, filter_name: str):
+def proccess_image(file_path: str, output_path: str, filter_name: str, filter_value: Optional[str] = None):
+    # One decode, every operation of the pipeline, one encode
     image = Image.open(file_path)
+    image = run_pipeline(image, parse_operations(filter_name, filter_value))
+    save_image(image, output_path, output_format(output_path))
 
-    if filter_name == "grayscale":
-        image = image.convert("L")
-    
-    elif filter_name == "blur":
-        image = image.filter(ImageFilter.BLUR)
-    
-    elif filter_name == "thumbnail":
-        image.thumbnail((100, 100))
-    
-    elif filter_name == "sepia":
-        # Convert to grayscale first
-        image = image.convert("L")
-        # Create sepia filter
-        sepia_filter = Image.new("RGB", image.size, (255, 240, 192))
-        # Convert grayscale to RGB for blending
-        image = image.convert("RGB")
-        # Blend the images
-        image = Image.blend(image, sepia_filter, 0.5)
-    
-    elif filter_name == "invert":
-        image = Image.eval(image, lambda x: 255 - x)
-    
-    elif filter_name == "brightness":
-        # Always increase brightness by 50%
-        image = ImageEnhance.Brightness(image).enhance(1.5)
-
-    image.save(output_path)
\ No newline at end of file
+
+def open_preview(file_path: str, size: int) -> Tuple[Image.Image, float]:
+    """
+    Decode file_path at about size pixels on its longest side, without
+    going through the full resolution. Returns the image and its scale.
+    """
+    image = Image.open(file_path)
+    full_width = image.width
+    # JPEG decodes straight at 1/2, 1/4 or 1/8 of the resolution
+    image.draft(image.mode, (size, size))
+    # reduce() by an integer factor first, the final resize works on few pixels
+    image.thumbnail((size, size), reducing_gap=2.0)
+    return image, image.width / full_width
+
+
+def render_preview(file_path: str, output_path: str, filter_name: str, filter_value: Optional[str], size: int, fmt: str):
+    image, scale = open_preview(file_path, size)
+    image = run_pipeline(image, parse_operations(filter_name, filter_value), scale=scale)
+    save_image(image, output_path, fmt)
+
+
+def output_format(output_path: str) -> str:
+    return os.path.splitext(output_path)[1].lstrip(".").lower()
+
+
+async def apply_filter(
+    file_path: str,
+    output_path: str,
+    filter_name: str,
+    filter_value: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> bool:
+    """
+    Render a filter into output_path, reusing the derivative cache when the
+    same original was already processed with the same filter.
+    Returns True when the result came from the cache.
+    """
+    # Imported here so pool workers only need Pillow to run proccess_image
+    from app.services.derivative_cache import derivative_cache
+    from app.services.executor import processing_executor
+    from app.utils.metrics import count_read_bytes
+
+    key = None
+    fmt = output_format(output_path)
+    if content_hash:
+        key = derivative_cache.make_key(content_hash, filter_name, filter_value, fmt)
+        if await asyncio.to_thread(derivative_cache.get_into, key, fmt, output_path):
+            return True
+
+    count_read_bytes(os.path.getsize(file_path))
+    await processing_executor.submit(proccess_image, file_path, output_path, filter_name, filter_value)
+
+    if key:
+        await asyncio.to_thread(derivative_cache.put, key, fmt, output_path)
+    return False
+
+
+async def preview_filter(
+    file_path: str,
+    content_hash: str,
+    filter_name: str,
+    filter_value: Optional[str],
+    size: int,
+    fmt: str,
+) -> str:
+    """
+    Path of a low resolution render of a filter, for interactive previews.
+    Rendered in the worker pool and kept in the derivative cache.
+    """
+    from app.services.derivative_cache import derivative_cache
+    from app.services.executor import processing_executor
+    from app.utils.metrics import count_read_bytes
+
+    key = derivative_cache.make_key(content_hash, filter_name, filter_value, fmt, preview=size)
+    cached_path = await asyncio.to_thread(derivative_cache.pin, key, fmt)
+    if cached_path:
+        return cached_path
+
+    tmp_path = derivative_cache.temp_path(fmt)
+    try:
+        count_read_bytes(os.path.getsize(file_path))
+        await processing_executor.submit(render_preview, file_path, tmp_path, filter_name, filter_value, size, fmt)
+        return await asyncio.to_thread(derivative_cache.put, key, fmt, tmp_path, move=True)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
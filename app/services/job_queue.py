@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+
+from app.config import (
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+)
+from app.models.job import Job, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+
+logger = logging.getLogger("jobs")
+
+
+class JobHandler(NamedTuple):
+    run: Callable[[Job], Awaitable[Optional[dict]]]
+    # Called once when a job runs out of attempts
+    on_give_up: Optional[Callable[[Job, str], None]] = None
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def register_handler(kind: str, run, on_give_up=None) -> None:
+    _handlers[kind] = JobHandler(run, on_give_up)
+
+
+def enqueue(kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS, delay: float = 0) -> Job:
+    job = Job(
+        kind=kind,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=datetime.now() + timedelta(seconds=delay),
+    )
+    job.save()
+    return job
+
+
+def claim(worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[Job]:
+    """
+    Atomically take the next due job, or one whose lease expired because
+    its worker died and that still has attempts left (see reap_expired).
+    The attempt counter goes up on every claim.
+    """
+    now = datetime.now()
+    raw = Job._get_collection().find_one_and_update(
+        {
+            "kind": {"$in": list(_handlers)},
+            "$or": [
+                {"status": JOB_QUEUED, "run_at": {"$lte": now}},
+                {
+                    "status": JOB_RUNNING,
+                    "lease_until": {"$lt": now},
+                    "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+                },
+            ],
+        },
+        {
+            "$set": {
+                "status": JOB_RUNNING,
+                "worker_id": worker_id,
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return Job._from_son(raw) if raw else None
+
+
+def reap_expired() -> List[Job]:
+    """
+    Mark as failed the jobs whose lease expired on their last attempt, the
+    worker died on every one of them. Returns those jobs.
+    """
+    now = datetime.now()
+    reaped = []
+    while True:
+        raw = Job._get_collection().find_one_and_update(
+            {
+                "kind": {"$in": list(_handlers)},
+                "status": JOB_RUNNING,
+                "lease_until": {"$lt": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+            },
+            {
+                "$set": {
+                    "status": JOB_FAILED,
+                    "last_error": "Lease expired, the worker stopped while running the job",
+                    "lease_until": None,
+                    "updated_at": now,
+                },
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if raw is None:
+            return reaped
+        reaped.append(Job._from_son(raw))
+
+
+async def give_up_expired() -> int:
+    """Run reap_expired and the give up handlers of what it found."""
+    jobs = await asyncio.to_thread(reap_expired)
+    for job in jobs:
+        logger.warning(f"Job {job.id} ({job.kind}) gave up after {job.attempts} attempts: {job.last_error}")
+        handler = _handlers[job.kind]
+        if handler.on_give_up:
+            await asyncio.to_thread(handler.on_give_up, job, job.last_error)
+    return len(jobs)
+
+
+def extend_lease(job: Job, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    # False means the lease was lost and another worker owns the job now
+    now = datetime.now()
+    return bool(Job.objects(id=job.id, worker_id=job.worker_id, status=JOB_RUNNING).update_one(
+        set__lease_until=now + timedelta(seconds=lease_seconds),
+        set__updated_at=now,
+    ))
+
+
+def complete(job: Job, result: Optional[dict] = None) -> None:
+    Job.objects(id=job.id, worker_id=job.worker_id).update_one(
+        set__status=JOB_DONE,
+        set__result=result,
+        set__lease_until=None,
+        set__updated_at=datetime.now(),
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter, capped
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def fail(job: Job, error: str) -> bool:
+    """Put the job back in the queue with backoff. Returns True when it gave up."""
+    now = datetime.now()
+    gave_up = job.attempts >= job.max_attempts
+    if gave_up:
+        update = {"set__status": JOB_FAILED}
+    else:
+        update = {
+            "set__status": JOB_QUEUED,
+            "set__run_at": now + timedelta(seconds=retry_delay(job.attempts)),
+        }
+    Job.objects(id=job.id, worker_id=job.worker_id).update_one(
+        set__last_error=error,
+        set__lease_until=None,
+        set__updated_at=now,
+        **update,
+    )
+    return gave_up
+
+
+async def run_job(job: Job, lease_seconds: int = JOB_LEASE_SECONDS) -> None:
+    """Run a claimed job, renewing its lease while the handler works."""
+    handler = _handlers[job.kind]
+
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not await asyncio.to_thread(extend_lease, job, lease_seconds):
+                logger.warning(f"Lost the lease of job {job.id}")
+                return
+
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        result = await handler.run(job)
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        gave_up = await asyncio.to_thread(fail, job, error)
+        logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {error}")
+        if gave_up and handler.on_give_up:
+            await asyncio.to_thread(handler.on_give_up, job, error)
+    else:
+        await asyncio.to_thread(complete, job, result)
+    finally:
+        heartbeat.cancel()
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE
+from app.utils import password
+
+
+class PasswordExecutorSaturated(Exception):
+    """Raised when too many password hashes are already running or waiting."""
+
+
+class PasswordExecutor:
+    """
+    Runs bcrypt outside of the event loop, on a small thread pool of its
+    own (bcrypt releases the GIL), so a burst of logins does not stall
+    image serving or use up the default executor.
+
+    At most `workers` hashes run at once and `queue_size` more wait for a
+    thread; anything beyond that is rejected with PasswordExecutorSaturated
+    so the auth endpoints can answer 429.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(workers, 1)
+        self.queue_size = queue_size
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        if self._pending >= self.capacity:
+            raise PasswordExecutorSaturated("Password hashing queue is full")
+
+        self._pending += 1
+        try:
+            self.start()
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+
+password_executor = PasswordExecutor(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_size=PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+async def hash_password(plain_password: str) -> str:
+    return await password_executor.submit(password.get_password_hash, plain_password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash or None), see app.utils.password.verify_and_update."""
+    return await password_executor.submit(password.verify_and_update, plain_password, hashed_password)
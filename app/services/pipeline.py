@@ -0,0 +1,167 @@
+from typing import List, Optional, Tuple
+from PIL import Image
+from app.services.filters import (
+    DEFAULT_BRIGHTNESS,
+    DEFAULT_THUMBNAIL_SIZE,
+    IDENTITY_LUT,
+    apply_lut,
+    apply_palette,
+    blur,
+    brightness_lut,
+    compose_lut,
+    grayscale,
+    invert_lut,
+    is_identity,
+    luma_lut,
+    sepia_palette,
+    thumbnail,
+)
+
+Operation = Tuple[str, Optional[str]]
+
+# Per pixel colour maps, they can be merged into lookup tables
+POINT_OPERATIONS = {"grayscale", "sepia", "invert", "brightness"}
+FILTERS = POINT_OPERATIONS | {"blur", "thumbnail"}
+
+
+def parse_operations(filter_name: str, filter_value: Optional[str] = None) -> List[Operation]:
+    """
+    Operations stored in an Image document. Pipelines keep their names and
+    values comma separated, a single filter is just a one step pipeline.
+    """
+    names = filter_name.split(",")
+    values = filter_value.split(",") if filter_value else []
+    values += [""] * (len(names) - len(values))
+    return [(name.strip(), value.strip() or None) for name, value in zip(names, values)]
+
+
+def format_operations(operations: List[Operation]) -> Tuple[str, Optional[str]]:
+    """Inverse of parse_operations, returns (filter_name, filter_value)."""
+    filter_name = ",".join(name for name, _ in operations)
+    values = [value or "" for _, value in operations]
+    filter_value = ",".join(values) if any(values) else None
+    return filter_name, filter_value
+
+
+class PointStep:
+    """Consecutive point operations fused into one conversion plus lookup tables."""
+
+    def __init__(self):
+        self.to_gray = False
+        self.lut = IDENTITY_LUT
+        # Brightness keeps the alpha band, invert maps it like the others
+        self.alpha_lut = IDENTITY_LUT
+        # (256, 3) table from gray to RGB, set by sepia
+        self.palette = None
+
+    def add(self, name: str, value: Optional[str]) -> bool:
+        """Fuse an operation into this step, False when it can not be done exactly."""
+        if name in ("invert", "brightness"):
+            lut = invert_lut() if name == "invert" else brightness_lut(
+                float(value) if value else DEFAULT_BRIGHTNESS
+            )
+            if self.palette is not None:
+                self.palette = compose_lut(self.palette, lut)
+            else:
+                self.lut = compose_lut(self.lut, lut)
+            if name == "invert":
+                self.alpha_lut = compose_lut(self.alpha_lut, lut)
+            return True
+
+        # grayscale and sepia start with a conversion to L, which only
+        # commutes with the tables collected so far if there are none
+        if not self.to_gray and not (is_identity(self.lut) and is_identity(self.alpha_lut)):
+            return False
+        if name == "grayscale":
+            if self.palette is not None:
+                self.lut = luma_lut(self.palette)
+                self.palette = None
+            self.to_gray = True
+            return True
+        if name == "sepia":
+            if self.palette is not None:
+                return False
+            self.palette = compose_lut(self.lut, sepia_palette())
+            self.lut = IDENTITY_LUT
+            self.to_gray = True
+            return True
+        return False
+
+    def apply(self, image: Image.Image) -> Image.Image:
+        if self.to_gray and image.mode != "L":
+            image = grayscale(image)
+        if self.palette is not None:
+            return apply_palette(image, self.palette)
+        if not (is_identity(self.lut) and is_identity(self.alpha_lut)):
+            image = apply_lut(image, self.lut, self.alpha_lut)
+        return image
+
+
+def plan_pipeline(operations: List[Operation]) -> list:
+    """
+    Reorder and fuse the operations. Downscaling is moved in front of point
+    operations (it commutes with them, and everything after runs on fewer
+    pixels) but never across a blur. Runs of point operations become a
+    single PointStep. Returns a list of (kind, argument) steps.
+    """
+    ordered: List[Operation] = []
+    for name, value in operations:
+        if name not in FILTERS:
+            raise ValueError(f"Unknown filter: {name}")
+        if name == "thumbnail":
+            position = len(ordered)
+            while position > 0 and ordered[position - 1][0] in POINT_OPERATIONS:
+                position -= 1
+            ordered.insert(position, (name, value))
+        else:
+            ordered.append((name, value))
+
+    steps = []
+    for name, value in ordered:
+        previous = steps[-1] if steps else None
+        if name in POINT_OPERATIONS:
+            if previous and previous[0] == "point" and previous[1].add(name, value):
+                continue
+            step = PointStep()
+            step.add(name, value)
+            steps.append(("point", step))
+        elif name == "thumbnail":
+            size = int(float(value)) if value else DEFAULT_THUMBNAIL_SIZE
+            if previous and previous[0] == "thumbnail":
+                # Two downscales in a row, only the smaller one matters
+                steps[-1] = ("thumbnail", min(previous[1], size))
+            else:
+                steps.append(("thumbnail", size))
+        elif name == "blur":
+            steps.append(("blur", float(value) if value else None))
+    return steps
+
+
+def normalize_mode(image: Image.Image) -> Image.Image:
+    # Palette and exotic modes can not be filtered or mapped directly
+    if image.mode in ("L", "RGB", "RGBA"):
+        return image
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def run_pipeline(image: Image.Image, operations: List[Operation], scale: float = 1.0) -> Image.Image:
+    """
+    Run the planned steps over one decoded image. scale is the size of the
+    image relative to the original, blur radii are scaled to match so a
+    reduced preview looks like the full render.
+    """
+    steps = plan_pipeline(operations)
+    if image.mode in ("1", "P", "PA") and any(kind != "thumbnail" for kind, _ in steps):
+        # Resizing a palette image falls back to nearest neighbour
+        image = normalize_mode(image)
+    for kind, argument in steps:
+        if kind == "thumbnail":
+            image = thumbnail(image, argument)
+            continue
+        image = normalize_mode(image)
+        if kind == "point":
+            image = argument.apply(image)
+        elif kind == "blur":
+            image = blur(image, argument * scale if argument else argument)
+    return image
@@ -0,0 +1,260 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from bson import json_util
+
+from app.config import (
+    PRINCIPAL_CACHE_BACKEND,
+    PRINCIPAL_CACHE_MAX_ENTRIES,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    REDIS_URL,
+)
+from app.models.user import User
+from app.utils.logger import setup_logger
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:
+    aioredis = None
+
+logger = setup_logger("principal_cache")
+
+
+class TTLCache:
+    """In process LRU where every entry also expires after a time to live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires at)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MemoryBackend:
+    """
+    User records cached in this process. Invalidations do not reach other
+    workers, they see a change once their entry expires: with several
+    uvicorn workers use the redis backend.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries, ttl)
+        self._generation = 0
+
+    async def generation(self) -> Optional[int]:
+        return self._generation
+
+    async def bump_generation(self) -> None:
+        self._generation += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self._cache.set(key, value)
+
+    async def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    async def close(self) -> None:
+        pass
+
+    def size(self) -> Optional[int]:
+        return len(self._cache)
+
+
+class RedisBackend:
+    """
+    User records in Redis, shared by every worker and node, so an
+    invalidation is seen everywhere at once. When Redis is unreachable the
+    cache is skipped and users are read from MongoDB.
+    """
+
+    shared = True
+    GENERATION_KEY = "principal:generation"
+
+    def __init__(self, url: str, ttl: float, client=None):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("The redis principal cache backend needs redis, install it with `pip install redis`")
+            client = aioredis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await self.client.get(key)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Principal cache read failed: {str(e)}")
+            return None
+
+    async def set(self, key: str, value: str) -> None:
+        try:
+            await self.client.set(key, value, ex=max(int(self.ttl), 1))
+        except (RedisError, OSError) as e:
+            logger.warning(f"Principal cache write failed: {str(e)}")
+
+    async def generation(self) -> Optional[int]:
+        # None when unknown, nothing is cached then
+        try:
+            return int(await self.client.get(self.GENERATION_KEY) or 0)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Principal cache read failed: {str(e)}")
+            return None
+
+    async def bump_generation(self) -> None:
+        try:
+            await self.client.incr(self.GENERATION_KEY)
+        except (RedisError, OSError) as e:
+            logger.error(f"Principal cache generation bump failed: {str(e)}")
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.client.delete(key)
+        except (RedisError, OSError) as e:
+            # The entry stays until its TTL runs out
+            logger.error(f"Principal cache invalidation failed for {key}: {str(e)}")
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class PrincipalCache:
+    """
+    What get_current_user resolves on every request: the decoded token and
+    the user record. Decoded tokens stay in this process, they only depend
+    on the token and the secret and never outlive the token expiry. User
+    records go to the backend and are dropped whenever the user is updated
+    or deleted through the repository.
+    """
+
+    def __init__(self, backend, max_entries: int, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = ttl > 0
+        self.tokens = TTLCache(max_entries, ttl)
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"principal:user:{user_id}"
+
+    def get_token(self, token: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        payload = self.tokens.get(token)
+        if payload is None:
+            self.token_misses += 1
+        else:
+            self.token_hits += 1
+        return payload
+
+    def put_token(self, token: str, payload: dict) -> None:
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if payload.get("exp") is not None:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            self.tokens.set(token, payload, ttl)
+
+    async def get_user(self, user_id: str) -> Optional[User]:
+        if not self.enabled:
+            return None
+        raw = await self.backend.get(self._user_key(user_id))
+        if raw is None:
+            self.user_misses += 1
+            return None
+        self.user_hits += 1
+        # A new object every time, callers may change it
+        return User._from_son(json_util.loads(raw))
+
+    async def generation(self) -> Optional[int]:
+        """
+        Bumped on every invalidation, in the backend so every worker of a
+        shared backend sees it. Read it before loading a user from MongoDB
+        and pass it to put_user, a lookup that raced with an invalidation
+        is then not cached.
+        """
+        if not self.enabled:
+            return None
+        return await self.backend.generation()
+
+    async def put_user(self, user: User, generation: Optional[int]) -> None:
+        if not self.enabled or generation is None or generation != await self.backend.generation():
+            return
+        await self.backend.set(self._user_key(str(user.pk)), json_util.dumps(user.to_mongo()))
+
+    async def invalidate_user(self, user_id: str) -> None:
+        if not self.enabled:
+            return
+        self.invalidations += 1
+        await self.backend.bump_generation()
+        await self.backend.delete(self._user_key(str(user_id)))
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "shared": self.backend.shared,
+            "token_hits": self.token_hits,
+            "token_misses": self.token_misses,
+            "tokens": len(self.tokens),
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses,
+            "users": self.backend.size(),
+            "invalidations": self.invalidations,
+            "token_evictions": self.tokens.evictions,
+        }
+
+
+def create_principal_cache(backend: str = PRINCIPAL_CACHE_BACKEND) -> PrincipalCache:
+    if backend == "memory":
+        cache_backend = MemoryBackend(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+    elif backend == "redis":
+        cache_backend = RedisBackend(REDIS_URL, PRINCIPAL_CACHE_TTL_SECONDS)
+    else:
+        raise ValueError(f"Unknown principal cache backend: {backend}")
+    return PrincipalCache(cache_backend, PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+principal_cache = create_principal_cache()
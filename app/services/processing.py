@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.models.images import Image
+from app.repositories import image_repository
+from app.services.derivative_cache import derivative_cache
+from app.services.image_processor import apply_filter
+from app.services.storage import blob_sha256, key_format, local_file, storage_key
+from app.storage import BlobNotFound, storage
+from app.utils.metrics import observe_processing
+
+
+async def ensure_content_hash(image: Image):
+    # Images uploaded before content hashing get their hash on first use
+    original_key = storage_key(image.original_path)
+    if not image.content_hash and await asyncio.to_thread(storage.exists, original_key):
+        content_hash = await asyncio.to_thread(blob_sha256, original_key)
+        await image_repository.update(image, content_hash=content_hash)
+    return image.content_hash
+
+
+async def original_file(image: Image) -> str:
+    """Local path of the original. Raises BlobNotFound when it is missing."""
+    original_key = storage_key(image.original_path)
+    content_hash = await ensure_content_hash(image)
+    if not content_hash:
+        raise BlobNotFound(original_key)
+    cache_key = derivative_cache.make_key(content_hash, None, None, key_format(original_key))
+    return await local_file(original_key, cache_key)
+
+
+async def processed_file(image: Image) -> Optional[str]:
+    """Local path of the current processed image, None when there is none."""
+    if not image.filter_name or not image.content_hash:
+        return None
+    processed_key = storage_key(image.processed_path)
+    fmt = key_format(processed_key)
+    cache_key = derivative_cache.make_key(image.content_hash, image.filter_name, image.filter_value, fmt)
+    try:
+        return await local_file(processed_key, cache_key)
+    except BlobNotFound:
+        return None
+
+
+async def render_image(image: Image, filter_name: str, filter_value: Optional[str] = None) -> bool:
+    """
+    Apply a filter or pipeline to a stored image and record it on the
+    document. Returns True when the result came from the derivative cache.
+
+    Raises FileNotFoundError when the original is missing, plus whatever
+    the processing executor raises (ExecutorSaturated, TimeoutError).
+    """
+    try:
+        original_path = await original_file(image)
+    except BlobNotFound as e:
+        raise FileNotFoundError(f"Original image file not found at path: {e.key}")
+
+    # Process image in the worker pool so the event loop stays free,
+    # unless the same original and filter are already in the cache
+    processed_key = storage_key(image.processed_path)
+    output_path = derivative_cache.temp_path(key_format(processed_key))
+    try:
+        started = time.perf_counter()
+        cache_hit = await apply_filter(
+            original_path, output_path, filter_name, filter_value,
+            content_hash=image.content_hash
+        )
+        observe_processing(filter_name, os.path.getsize(original_path), cache_hit, time.perf_counter() - started)
+        try:
+            await asyncio.to_thread(storage.put_file, processed_key, output_path)
+        except OSError as e:
+            raise RuntimeError(f"Error saving processed image at path: {processed_key}: {str(e)}")
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    await image_repository.update(
+        image,
+        filter_name=filter_name,
+        filter_value=filter_value,
+        updated_at=datetime.now()
+    )
+    return cache_hit
@@ -0,0 +1,66 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.config import PROFILING_DIR, PROFILING_MAX_FILES
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def profile_path(profile_id: str, ext: str = "prof") -> Optional[str]:
+    # Ids come from the URL, only ours (uuid4 hex) map to a file
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    return os.path.join(PROFILING_DIR, f"{profile_id}.{ext}")
+
+
+def save_profile(profiler: cProfile.Profile, profile_id: str, info: dict) -> None:
+    """
+    Store a request profile as <id>.prof (pstats format, for `python -m
+    pstats` or snakeviz) next to <id>.json with what the request cost, then
+    drop the oldest ones past PROFILING_MAX_FILES.
+    """
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id))
+    info = {"id": profile_id, "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), **info}
+    with open(profile_path(profile_id, "json"), "w") as f:
+        json.dump(info, f)
+    prune_profiles(PROFILING_MAX_FILES)
+
+
+def list_profiles() -> List[dict]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILING_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILING_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILING_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            # Removed or being written meanwhile
+            continue
+    profiles.sort(key=lambda p: p.get("created_at", ""), reverse=True)
+    return profiles
+
+
+def prune_profiles(max_files: int) -> None:
+    for profile in list_profiles()[max_files:]:
+        for ext in ("prof", "json"):
+            path = profile_path(profile.get("id", ""), ext)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def profile_text(path: str, limit: int, sort: str = "cumulative") -> str:
+    """The top `limit` functions of a stored profile, as `python -m pstats` prints them."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
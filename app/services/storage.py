@@ -1,17 +1,106 @@
-import os 
+import asyncio
+import os
+import hashlib
+from typing import NamedTuple
 from uuid import uuid4
+from app.config import MAX_FILE_SIZE, STORAGE_SPOOL_DIR
+from app.storage import CHUNK_SIZE, storage
+from app.utils.metrics import count_read_bytes
+from app.utils.validate_image import check_file_size, check_image_format
+
+# Paths stored before the storage backends were relative to this folder
+LEGACY_ROOT = "uploads/"
+
+class SpooledUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    format: str
 
 def normalize_path(path: str) -> str:
     """Normalize path to use forward slashes and remove any double slashes."""
     return os.path.normpath(path).replace("\\", "/")
 
-def save_upload_file(upload_file, destination_folder: str) -> str:
-    os.makedirs(destination_folder, exist_ok=True)
+def storage_key(path: str) -> str:
+    """Storage key of a path saved on an image, old documents have "uploads/..." paths."""
+    path = normalize_path(path)
+    if path.startswith(LEGACY_ROOT):
+        path = path[len(LEGACY_ROOT):]
+    return path
+
+def key_format(key: str) -> str:
+    return os.path.splitext(key)[1].lstrip(".").lower()
+
+def save_upload_file(upload_file, max_size: int = MAX_FILE_SIZE) -> SpooledUpload:
+    """
+    Copy an upload to a local spool file in fixed size chunks. In the same
+    pass the size limit is enforced, the SHA-256 is computed and the format
+    is sniffed from the magic bytes, so memory use does not depend on the
+    file size. Nothing reaches the storage until the upload is valid.
+    """
+    os.makedirs(STORAGE_SPOOL_DIR, exist_ok=True)
     file_ext = upload_file.filename.split(".")[-1]
-    file_name = f"{uuid4()}.{file_ext}"
-    file_path = normalize_path(os.path.join(destination_folder, file_name))
+    tmp_path = os.path.join(STORAGE_SPOOL_DIR, f"{uuid4()}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    image_format = None
+    source = upload_file.file
+    source.seek(0)
+    try:
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                if image_format is None:
+                    image_format = check_image_format(chunk, file_ext)
+                size += len(chunk)
+                check_file_size(size, max_size)
+                digest.update(chunk)
+                buffer.write(chunk)
+        if image_format is None:
+            # Empty upload
+            image_format = check_image_format(b"", file_ext)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return SpooledUpload(tmp_path, size, digest.hexdigest(), image_format)
+
+def blob_sha256(key: str) -> str:
+    """Hash a stored file in chunks, without loading it in memory."""
+    digest = hashlib.sha256()
+    for chunk in storage.stream(key):
+        digest.update(chunk)
+        count_read_bytes(len(chunk))
+    return digest.hexdigest()
+
+async def local_file(key: str, cache_key: str) -> str:
+    """
+    Path of a stored file on the local disk, for Pillow and file responses.
+    Files of remote backends are downloaded once into the derivative cache,
+    under cache_key, which must change whenever the content does.
+    """
+    from app.services.derivative_cache import derivative_cache
+
+    path = storage.local_path(key)
+    if path is not None:
+        return path
+
+    fmt = key_format(key)
+    cached_path = await asyncio.to_thread(derivative_cache.pin, cache_key, fmt)
+    if cached_path:
+        return cached_path
 
-    with open(file_path, "wb") as buffer:
-        buffer.write(upload_file.file.read())
+    tmp_path = derivative_cache.temp_path(fmt)
+    try:
+        await asyncio.to_thread(download, key, tmp_path)
+        return await asyncio.to_thread(derivative_cache.put, cache_key, fmt, tmp_path, move=True)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    return file_path
\ No newline at end of file
+def download(key: str, file_path: str) -> None:
+    with open(file_path, "wb") as f:
+        for chunk in storage.stream(key):
+            f.write(chunk)
+            count_read_bytes(len(chunk))
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from PIL import Image
+
+from app.config import (
+    VARIANT_WIDTHS,
+    VARIANT_FORMATS,
+    VARIANT_DEFAULT_FORMAT,
+    VARIANT_PREGENERATE_CONCURRENCY,
+    VARIANT_PREGENERATE_HEADROOM,
+)
+from app.services.encoding import is_supported, save_image
+
+logger = logging.getLogger("images")
+
+# Pregeneration shares the executor with interactive requests, it runs a
+# few uploads at a time and only while the queue has room to spare
+_pregenerate_slots = asyncio.Semaphore(VARIANT_PREGENERATE_CONCURRENCY)
+
+
+def is_allowed_variant(width: int, fmt: str) -> bool:
+    return width in VARIANT_WIDTHS and fmt in VARIANT_FORMATS and is_supported(fmt)
+
+
+def render_variant(file_path: str, output_path: str, width: Optional[int], fmt: str):
+    # Without a width the image is only re-encoded in fmt
+    image = Image.open(file_path)
+    if width and image.width > width:
+        # thumbnail keeps the aspect ratio and lets JPEG decode at reduced size
+        image.thumbnail((width, image.height))
+    save_image(image, output_path, fmt)
+
+
+async def get_variant(
+    file_path: str,
+    content_hash: str,
+    filter_name: Optional[str],
+    filter_value: Optional[str],
+    width: Optional[int],
+    fmt: str,
+) -> str:
+    """
+    Path of the variant of file_path resized to width (or only re-encoded
+    when width is None), rendered in the worker pool the first time and
+    served from the derivative cache afterwards.
+    """
+    from app.services.derivative_cache import derivative_cache
+    from app.services.executor import processing_executor
+    from app.utils.metrics import count_read_bytes
+
+    key = derivative_cache.make_key(content_hash, filter_name, filter_value, fmt, width)
+    cached_path = await asyncio.to_thread(derivative_cache.pin, key, fmt)
+    if cached_path:
+        return cached_path
+
+    tmp_path = derivative_cache.temp_path(fmt)
+    try:
+        count_read_bytes(os.path.getsize(file_path))
+        await processing_executor.submit(render_variant, file_path, tmp_path, width, fmt)
+        return await asyncio.to_thread(derivative_cache.put, key, fmt, tmp_path, move=True)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def executor_busy() -> bool:
+    from app.services.executor import processing_executor
+
+    limit = max(processing_executor.capacity - VARIANT_PREGENERATE_HEADROOM, 1)
+    return processing_executor.pending >= limit
+
+
+async def pregenerate_variants(original_key: str, content_hash: str, fmt: str = VARIANT_DEFAULT_FORMAT):
+    # Runs after the upload response, failures and skips only cost a later on-demand render
+    from app.services.derivative_cache import derivative_cache
+    from app.services.storage import key_format, local_file
+
+    async with _pregenerate_slots:
+        try:
+            cache_key = derivative_cache.make_key(content_hash, None, None, key_format(original_key))
+            file_path = await local_file(original_key, cache_key)
+        except Exception as e:
+            logger.warning(f"Could not pregenerate variants of {original_key}: {str(e)}")
+            return
+        for width in VARIANT_WIDTHS:
+            if executor_busy():
+                logger.info(f"Processing queue busy, skipping pregeneration of {original_key} from {width}px")
+                return
+            try:
+                await get_variant(file_path, content_hash, None, None, width, fmt)
+            except Exception as e:
+                logger.warning(f"Could not pregenerate {width}px {fmt} variant of {file_path}: {str(e)}")
@@ -0,0 +1,35 @@
+from app.config import (
+    STORAGE_BACKEND,
+    STORAGE_LOCAL_ROOT,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+)
+from app.storage.base import CHUNK_SIZE, BlobNotFound, StorageBackend
+from app.storage.local import LocalStorage
+from app.storage.memory import MemoryStorage
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    if backend == "local":
+        return LocalStorage(STORAGE_LOCAL_ROOT)
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "s3":
+        from app.storage.s3 import S3Storage
+        return S3Storage(S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage()
+
+__all__ = [
+    "CHUNK_SIZE",
+    "BlobNotFound",
+    "StorageBackend",
+    "LocalStorage",
+    "MemoryStorage",
+    "create_storage",
+    "storage",
+]
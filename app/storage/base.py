@@ -0,0 +1,62 @@
+import os
+import posixpath
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, Optional, Union
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFound(FileNotFoundError):
+    def __init__(self, key: str):
+        super().__init__(f"File not found in storage: {key}")
+        self.key = key
+
+
+def check_key(key: str) -> str:
+    # Keys are relative POSIX paths like "original/<uuid>.png"
+    normalized = posixpath.normpath(key)
+    if not key or normalized.startswith(("/", "..")) or normalized != key:
+        raise ValueError(f"Invalid storage key: {key}")
+    return key
+
+
+class StorageBackend(ABC):
+    """Blob storage for the uploaded and processed images, addressed by key."""
+
+    @abstractmethod
+    def put(self, key: str, data: Union[bytes, BinaryIO]) -> int:
+        """Store bytes or a file object (read in chunks) under key, replacing it. Returns the size."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        pass
+
+    @abstractmethod
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Chunks of the blob, or only of the inclusive byte range start-end."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Remove a blob. Returns False when there was nothing to remove."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        pass
+
+    def put_file(self, key: str, file_path: str) -> int:
+        """Move a local file into the storage."""
+        with open(file_path, "rb") as f:
+            size = self.put(key, f)
+        os.remove(file_path)
+        return size
+
+    def local_path(self, key: str) -> Optional[str]:
+        """
+        Path of the blob on the local disk, so it can be handed to Pillow or
+        sent with sendfile. None when the backend keeps blobs elsewhere.
+        """
+        return None
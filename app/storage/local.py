@@ -0,0 +1,102 @@
+import hashlib
+import os
+import shutil
+from typing import BinaryIO, Iterator, Optional, Union
+from uuid import uuid4
+
+from app.storage.base import CHUNK_SIZE, BlobNotFound, StorageBackend, check_key
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under a root directory, sharded by hash prefix so no directory
+    grows past a few thousand entries: "original/x.png" is stored as
+    <root>/original/ab/cd/x.png.
+    """
+
+    def __init__(self, root: str, shard_depth: int = 2):
+        self.root = root
+        self.shard_depth = shard_depth
+
+    def path(self, key: str) -> str:
+        directory, name = os.path.split(check_key(key))
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, directory, *shards, name)
+
+    def _find(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        if os.path.exists(path):
+            return path
+        # Files stored before sharding are still in the flat layout
+        flat_path = os.path.join(self.root, key)
+        if os.path.isfile(flat_path):
+            return flat_path
+        return None
+
+    def local_path(self, key: str) -> str:
+        path = self._find(key)
+        if path is None:
+            raise BlobNotFound(key)
+        return path
+
+    def put(self, key: str, data: Union[bytes, BinaryIO]) -> int:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid4()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                if isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def put_file(self, key: str, file_path: str) -> int:
+        # A rename when the file is on the same filesystem
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(file_path, path)
+        return os.path.getsize(path)
+
+    def get(self, key: str) -> bytes:
+        with open(self.local_path(key), "rb") as f:
+            return f.read()
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        path = self.local_path(key)
+
+        def chunks():
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+
+        return chunks()
+
+    def delete(self, key: str) -> bool:
+        path = self._find(key)
+        if path is None:
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def exists(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.local_path(key))
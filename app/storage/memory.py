@@ -0,0 +1,42 @@
+import threading
+from typing import BinaryIO, Dict, Iterator, Optional, Union
+
+from app.storage.base import CHUNK_SIZE, BlobNotFound, StorageBackend, check_key
+
+
+class MemoryStorage(StorageBackend):
+    """Blobs in a dict, for tests. Not shared between processes."""
+
+    def __init__(self):
+        self._blobs: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, data: Union[bytes, BinaryIO]) -> int:
+        check_key(key)
+        if not isinstance(data, bytes):
+            data = data.read()
+        with self._lock:
+            self._blobs[key] = data
+        return len(data)
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            if key not in self._blobs:
+                raise BlobNotFound(key)
+            return self._blobs[key]
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        data = self.get(key)
+        stop = len(data) if end is None else min(end + 1, len(data))
+        return (data[offset:min(offset + CHUNK_SIZE, stop)] for offset in range(start, stop, CHUNK_SIZE))
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._blobs.pop(key, None) is not None
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return key in self._blobs
+
+    def size(self, key: str) -> int:
+        return len(self.get(key))
@@ -0,0 +1,89 @@
+import io
+import os
+from typing import BinaryIO, Iterator, Optional, Union
+
+from app.storage.base import CHUNK_SIZE, BlobNotFound, StorageBackend, check_key
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+NOT_FOUND_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+class S3Storage(StorageBackend):
+    """
+    Blobs in an S3 bucket. endpoint_url points it to any S3 compatible
+    service (MinIO, a local stand-in). Credentials come from the usual
+    AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY environment variables.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("The s3 storage backend needs boto3, install it with `pip install boto3`")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{check_key(key)}"
+
+    def _raise_not_found(self, error: "ClientError", key: str):
+        if error.response.get("Error", {}).get("Code") in NOT_FOUND_CODES:
+            raise BlobNotFound(key) from error
+        raise error
+
+    def put(self, key: str, data: Union[bytes, BinaryIO]) -> int:
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        start = data.tell()
+        size = data.seek(0, os.SEEK_END) - start
+        data.seek(start)
+        # Multipart upload for big files, read in chunks
+        self.client.upload_fileobj(data, self.bucket, self._object_key(key))
+        return size
+
+    def _get_object(self, key: str, byte_range: Optional[str] = None):
+        kwargs = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if byte_range:
+            kwargs["Range"] = byte_range
+        try:
+            return self.client.get_object(**kwargs)
+        except ClientError as e:
+            self._raise_not_found(e, key)
+
+    def get(self, key: str) -> bytes:
+        return self._get_object(key)["Body"].read()
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        byte_range = None
+        if start or end is not None:
+            byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self._get_object(key, byte_range)["Body"]
+        return body.iter_chunks(CHUNK_SIZE)
+
+    def delete(self, key: str) -> bool:
+        # S3 does not tell whether the object was there
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return existed
+
+    def _head(self, key: str) -> dict:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            self._raise_not_found(e, key)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._head(key)
+        except BlobNotFound:
+            return False
+        return True
+
+    def size(self, key: str) -> int:
+        return self._head(key)["ContentLength"]
@@ -0,0 +1,125 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from app.config import IMAGE_CACHE_CONTROL
+from app.utils.metrics import count_read_bytes
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+def make_etag(*parts: Optional[str]) -> str:
+    # Strong ETag, the parts must identify the exact bytes that are sent
+    raw = "|".join(part or "" for part in parts)
+    return f'"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+def http_date(value: datetime) -> str:
+    # Dates in the models are naive local times
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when there is no ETag to compare."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison is allowed for If-None-Match
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.astimezone()
+        return modified.replace(microsecond=0) <= since
+    return False
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets.
+    Returns None when the header should be ignored and raises ValueError
+    when the range can not be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    if not (start_text.isdigit() or start_text == "") or not (end_text.isdigit() or end_text == ""):
+        # Malformed ranges are ignored and the full file is sent
+        return None
+    if start_text == "":
+        # Suffix range, the last N bytes
+        if not end_text or int(end_text) == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - int(end_text), 0), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+def iter_file_range(file_path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def file_response(
+    request: Request,
+    file_path: str,
+    media_type: str,
+    headers: dict,
+    filename: Optional[str] = None,
+) -> Response:
+    """FileResponse that also answers single byte Range requests with 206."""
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers.get("ETag")):
+        size = os.path.getsize(file_path)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            count_read_bytes(end - start + 1)
+            return StreamingResponse(
+                iter_file_range(file_path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1),
+                }
+            )
+    count_read_bytes(os.path.getsize(file_path))
+    return FileResponse(file_path, media_type=media_type, filename=filename, headers=headers)
@@ -1,39 +1,186 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
-from datetime import datetime
+from typing import Dict, Optional
 
-# Logger dir 
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
+from app.config import LOG_DIR, LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLING
 
-# Looger set up
-def setup_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+# Id of the request being handled, set by RequestContextMiddleware and
+# copied into every record logged while handling it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
 
-    # Log format
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+# Attributes every LogRecord has, anything else came from `extra`
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_configured = False
+_file_handler: Optional[logging.Handler] = None
+
+
+def parse_sampling(raw: str) -> Dict[str, float]:
+    # "images.access=0.1,http.access=1" -> {"images.access": 0.1, "http.access": 1.0}
+    rates = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Adds the request id. Runs in the thread (and context) that logged."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the INFO and lower records of some loggers,
+    e.g. the per-image access lines. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. The message is formatted here,
+    in the caller, so the record can cross threads; when the queue is full
+    the record is dropped instead of blocking the event loop.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request id and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [{request_id}]" if request_id else line
+
+
+def configure_logging() -> None:
+    """
+    Route every log record through one queue to a listener thread that does
+    the console writes, and the file writes once enable_file_logging() is
+    called. Safe to call more than once, only the first call sets it up.
+    """
+    global _listener, _configured
+    if _configured:
+        return
+    _configured = True
 
-    # Handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(make_formatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+    queue_handler.addFilter(ContextFilter())
+    logging.getLogger().addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(stop_logging)
 
-    log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y-%m-%d')}.log")
-    file_handler = RotatingFileHandler(
+
+def make_formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+
+
+def enable_file_logging() -> None:
+    """
+    Also write the log to a dated file in LOG_DIR. Called when the API,
+    the worker or the migrations start, so importing the app (tests,
+    benchmarks) leaves no files behind.
+    """
+    global _file_handler
+    configure_logging()
+    if _file_handler is not None or _listener is None:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_file = os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+    _file_handler = RotatingFileHandler(
         log_file,
         maxBytes=10485760, # MAX equal to 10MB
         backupCount=5
     )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    _file_handler.setFormatter(make_formatter())
+    # The listener thread reads the tuple on every record
+    _listener.handlers = _listener.handlers + (_file_handler,)
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
 
+
+# Looger set up
+def setup_logger(name: str) -> logging.Logger:
+    """Named logger of the app. Handlers live on the root logger, so this is idempotent."""
+    configure_logging()
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
     return logger
 
 # Logger instance
-app_logger = setup_logger("app") 
\ No newline at end of file
+app_logger = setup_logger("app")
@@ -0,0 +1,186 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# Own registry, /metrics shows the app's metrics and nothing registered by libraries
+registry = CollectorRegistry(auto_describe=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "Requests being handled",
+    registry=registry,
+)
+http_response_bytes = Counter(
+    "http_response_bytes",
+    "Response body bytes sent by route template, e.g. the images served by /file and /serve",
+    ["route"],
+    registry=registry,
+)
+image_process_duration = Histogram(
+    "image_process_duration_seconds",
+    "Time to apply a filter or pipeline to an image",
+    ["filter_name", "size", "cache"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+mongo_operations = Counter(
+    "mongo_operations",
+    "MongoDB commands sent by the app, through Motor or mongoengine",
+    ["collection", "operation"],
+    registry=registry,
+)
+mongo_operations_per_request = Histogram(
+    "mongo_operations_per_request",
+    "MongoDB commands sent while handling one request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+    registry=registry,
+)
+
+
+
+class RequestStats:
+    """What the request being handled cost: MongoDB operations, file bytes read and image work."""
+
+    __slots__ = ("mongo_ops", "read_bytes", "pillow_seconds")
+
+    def __init__(self):
+        self.mongo_ops = 0
+        # Files served from disk, streamed from the storage or handed to a Pillow task
+        self.read_bytes = 0
+        # Waiting on the processing executor, Pillow runs in its workers
+        self.pillow_seconds = 0.0
+
+
+# Stats of the request being handled, set by MetricsMiddleware
+request_stats_var: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Original file size buckets of image_process_duration_seconds
+SIZE_BUCKETS = ((100 * 1024, "lt_100kb"), (1024 * 1024, "lt_1mb"), (5 * 1024 * 1024, "lt_5mb"))
+
+
+def size_label(size_bytes: int) -> str:
+    for limit, label in SIZE_BUCKETS:
+        if size_bytes < limit:
+            return label
+    return "gte_5mb"
+
+
+def filter_label(filter_name: str) -> str:
+    # Pipelines ("sepia,blur,...") would make one series per combination
+    return "pipeline" if "," in filter_name else filter_name
+
+
+def observe_processing(filter_name: str, size_bytes: int, cache_hit: bool, seconds: float) -> None:
+    image_process_duration.labels(
+        filter_label(filter_name), size_label(size_bytes), "hit" if cache_hit else "miss"
+    ).observe(seconds)
+
+
+def count_mongo_op(collection: str, operation: str) -> None:
+    mongo_operations.labels(collection, operation).inc()
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.mongo_ops += 1
+
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """
+    Counts the commands of every client it is given to (see pool_options),
+    so the Motor repositories and the mongoengine queries both show up.
+    pymongo calls it in the thread sending the command, which carries the
+    request context: asyncio.to_thread and Motor's executor copy it.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        # getMore names its collection apart, the value is the cursor id
+        key = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(key)
+        # Handshakes, auth, ping, endSessions and the like touch no collection
+        if isinstance(collection, str):
+            count_mongo_op(collection, event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+mongo_command_counter = MongoCommandCounter()
+
+
+def count_read_bytes(size: int) -> None:
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.read_bytes += size
+
+
+def count_pillow_time(seconds: float) -> None:
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.pillow_seconds += seconds
+
+
+class RuntimeCollector:
+    """
+    State read when /metrics is scraped: executor queues, caches, dropped logs.
+
+    describe() lists the metrics without reading anything, otherwise the
+    registry would call collect() on register, while this module is still
+    being imported by the executor.
+    """
+
+    def describe(self):
+        yield GaugeMetricFamily("executor_queue_depth", "Tasks running or waiting in an executor", labels=["executor"])
+        yield GaugeMetricFamily("executor_capacity", "Tasks an executor accepts before rejecting", labels=["executor"])
+        yield CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        yield CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        yield GaugeMetricFamily("derivative_cache_size_bytes", "Size of the derivative cache")
+        yield CounterMetricFamily("log_records_dropped", "Log records dropped because the queue was full")
+
+    def collect(self):
+        from app.services.derivative_cache import derivative_cache
+        from app.services.executor import processing_executor
+        from app.services.password_executor import password_executor
+        from app.services.principal_cache import principal_cache
+        from app.utils.logger import NonBlockingQueueHandler
+
+        pending = GaugeMetricFamily("executor_queue_depth", "Tasks running or waiting in an executor", labels=["executor"])
+        capacity = GaugeMetricFamily("executor_capacity", "Tasks an executor accepts before rejecting", labels=["executor"])
+        for name, executor in (("processing", processing_executor), ("password", password_executor)):
+            pending.add_metric([name], executor.pending)
+            capacity.add_metric([name], executor.capacity)
+        yield pending
+        yield capacity
+
+        derivative = derivative_cache.stats()
+        principal = principal_cache.stats()
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        for name, hit, miss in (
+            ("derivative", derivative["hits"], derivative["misses"]),
+            ("principal_token", principal["token_hits"], principal["token_misses"]),
+            ("principal_user", principal["user_hits"], principal["user_misses"]),
+        ):
+            hits.add_metric([name], hit)
+            misses.add_metric([name], miss)
+        yield hits
+        yield misses
+        yield GaugeMetricFamily("derivative_cache_size_bytes", "Size of the derivative cache", value=derivative["size_bytes"])
+        yield CounterMetricFamily("log_records_dropped", "Log records dropped because the queue was full", value=NonBlockingQueueHandler.dropped)
+
+
+registry.register(RuntimeCollector())
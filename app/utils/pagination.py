@@ -0,0 +1,76 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sort options of the listings, keyset pagination on (field, _id)
+SORT_OPTIONS = {
+    "uploaded_at": ("uploaded_at", 1),
+    "-uploaded_at": ("uploaded_at", -1),
+}
+DEFAULT_SORT = "uploaded_at"
+
+def encode_cursor(value: Optional[datetime], last_id) -> str:
+    # Opaque cursor, clients should not build it themselves. Old documents
+    # may lack the sort field, the value is left empty for them
+    raw = f"{'' if value is None else value.isoformat()}|{last_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], ObjectId]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, last_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        return (datetime.fromisoformat(value) if value else None), ObjectId(last_id)
+    except (InvalidId, ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def after_cursor(field: str, direction: int, value: Optional[datetime], last_id: ObjectId) -> list:
+    """
+    $or clauses of the documents that come after (value, last_id). MongoDB
+    sorts documents without the field (or with null) before any date, and
+    among themselves by _id, but $gt/$lt on a date never match them.
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    if value is None:
+        same = {field: None, "_id": {op: last_id}}
+        return [same, {field: {"$ne": None}}] if direction == 1 else [same]
+    after = [{field: {op: value}}, {field: value, "_id": {op: last_id}}]
+    return after if direction == 1 else after + [{field: None}]
+
+async def paginate(repository, query: dict, cursor: Optional[str], limit: int, sort: str = DEFAULT_SORT, projection: Optional[dict] = None):
+    """
+    Keyset pagination on (sort field, _id), served by the compound indexes
+    of the model. Returns the page of documents and the cursor for the next
+    page, or None when this is the last one.
+
+    With a projection the page holds raw documents with only those fields
+    (plus _id), instead of model objects.
+    """
+    field, direction = SORT_OPTIONS[sort]
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = {**query, "$or": after_cursor(field, direction, *after)}
+    order = [(field, direction), ("_id", direction)]
+    if projection is not None:
+        # The cursor needs the sort field even if the caller did not ask for it
+        projection = {**projection, field: 1}
+    # Raw documents, a model object would fill a missing field with its default
+    docs = await repository.find_raw(query, sort=order, limit=limit + 1, projection=projection)
+    next_cursor = None
+    if len(docs) > limit:
+        last = docs[limit - 1]
+        next_cursor = encode_cursor(last.get(field), last["_id"])
+    docs = docs[:limit]
+    if projection is None:
+        docs = [repository.load(raw) for raw in docs]
+    return docs, next_cursor
@@ -1,9 +1,22 @@
+from typing import Optional, Tuple
 from passlib.context import CryptContext
+from app.config import BCRYPT_ROUNDS
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# Hashes with any other cost need an update, they are rehashed at login
+pwd_context = CryptContext(
+    schemes=['bcrypt'],
+    deprecated='auto',
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(password, hashed_password)
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password, with the new hash when the stored one uses old settings."""
+    return pwd_context.verify_and_update(password, hashed_password)
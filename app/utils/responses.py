@@ -0,0 +1,21 @@
+from typing import Any
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard encoder
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson. Content must already be plain
+    data (dicts, lists, strings, numbers, datetimes), it is not run through
+    jsonable_encoder or a response_model, so return it directly from the
+    endpoint.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
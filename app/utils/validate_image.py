@@ -1,34 +1,41 @@
-from PIL import Image as PILImage
+from typing import Optional
 from fastapi import UploadFile, HTTPException, status
 from app.config import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
 
+# Magic bytes of the formats we know how to handle, and their extensions
+IMAGE_SIGNATURES = {
+    "png": (b"\x89PNG\r\n\x1a\n", {"png"}),
+    "jpeg": (b"\xff\xd8\xff", {"jpg", "jpeg"}),
+}
+
 def validate_image(file: UploadFile) -> None:
-    # Check file extension
+    # Check file extension, size and content are checked while the upload is stored
     file_ext = file.filename.split('.')[-1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File extension not allowed. Allowed extensions: {', '.join(ALLOWED_EXTENSIONS)}"
         )
-    
-    # Check file size
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
-    
-    if size > MAX_FILE_SIZE:
+
+def check_file_size(size: int, max_size: int = MAX_FILE_SIZE) -> None:
+    if size > max_size:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE/1024/1024}MB"
+            detail=f"File too large. Maximum size is {max_size/1024/1024}MB"
         )
-    
-    # Validate image format
-    try:
-        image = PILImage.open(file.file)
-        image.verify()
-        file.file.seek(0)
-    except Exception:
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    for image_format, (signature, _) in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+def check_image_format(header: bytes, file_ext: str) -> str:
+    # The first chunk of the upload must match the declared extension
+    image_format = sniff_image_format(header)
+    if image_format is None or file_ext.lower() not in IMAGE_SIGNATURES[image_format][1]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid image file"
-        )
\ No newline at end of file
+        )
+    return image_format
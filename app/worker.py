@@ -0,0 +1,82 @@
+"""
+Processing worker, runs the jobs queued by the API.
+
+    python -m app.worker
+
+Workers and API nodes only share MongoDB and the uploads storage, so
+each side can be scaled on its own.
+"""
+import asyncio
+import os
+import signal
+import socket
+
+from app.config import JOB_LEASE_SECONDS, WORKER_CONCURRENCY, WORKER_POLL_SECONDS
+from app.db.init_db import connect_db, close_db
+from app.services.executor import processing_executor
+from app.services.job_queue import claim, give_up_expired, run_job
+from app.utils.logger import enable_file_logging, setup_logger
+
+# Registers the job handlers
+import app.services.batch  # noqa: F401
+
+logger = setup_logger("worker")
+
+
+async def work(worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        job = await asyncio.to_thread(claim, worker_id)
+        if job is None:
+            # Nothing due, wait for the next poll or the stop signal
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        logger.info(f"Running job {job.id} ({job.kind}), attempt {job.attempts}")
+        await run_job(job)
+
+
+async def reap(stop: asyncio.Event):
+    # Jobs that killed their worker on every attempt are not claimed again,
+    # they are failed here so their give up handler runs
+    while not stop.is_set():
+        try:
+            await give_up_expired()
+        except Exception as e:
+            logger.error(f"Error reaping expired jobs: {str(e)}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOB_LEASE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main():
+    enable_file_logging()
+    connect_db()
+    processing_executor.start()
+    concurrency = WORKER_CONCURRENCY or max(processing_executor.workers, 1)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    # Finish the jobs in hand on SIGTERM/SIGINT, then exit
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f"Worker {worker_id} started with {concurrency} slots")
+    try:
+        # Each slot has its own id, so a lease taken over by a sibling slot
+        # is detected like one taken by another process
+        await asyncio.gather(
+            reap(stop),
+            *(work(f"{worker_id}-{slot}", stop) for slot in range(concurrency)),
+        )
+    finally:
+        processing_executor.shutdown()
+        close_db()
+        logger.info(f"Worker {worker_id} stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
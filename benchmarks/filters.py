@@ -0,0 +1,149 @@
+"""
+Micro-benchmark of the image filters.
+
+    python -m benchmarks.filters                    time every filter
+    python -m benchmarks.filters --filters blur     only some of them
+
+Every filter (and one fused pipeline) runs through run_pipeline, the same
+code the API uses, on in-memory images of several sizes and modes (RGB,
+RGBA, L and palette), so decoding and encoding are left out. Timings are
+the median and best of --repeat runs; allocations are the tracemalloc
+peak of one more run, which sees numpy buffers but not the pixel memory
+Pillow allocates itself, that one is reported as output_bytes.
+
+The outputs are checked against golden images by tests/test_filters.py,
+on the same test card.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.services.pipeline import parse_operations, run_pipeline
+
+MODES = ["RGB", "RGBA", "L", "P"]
+DEFAULT_SIZES = "256x256,1024x768,2048x1536"
+
+# name, filter_name, filter_value
+CASES: List[Tuple[str, str, Optional[str]]] = [
+    ("grayscale", "grayscale", None),
+    ("sepia", "sepia", None),
+    ("invert", "invert", None),
+    ("brightness", "brightness", "1.3"),
+    ("blur", "blur", "2"),
+    ("thumbnail", "thumbnail", "100"),
+    ("sepia+brightness", "sepia,brightness", ",1.3"),
+]
+
+
+def make_image(mode: str, width: int, height: int) -> Image.Image:
+    """
+    Deterministic test card, integer arithmetic only so it is the same on
+    every platform: gradients, a checkerboard (edges for blur) and, for
+    RGBA, an alpha ramp.
+    """
+    y, x = np.mgrid[0:height, 0:width].astype(np.int64)
+    checker = ((x // 8 + y // 8) % 2) * 64
+    red = (x * 255 // max(width - 1, 1) + checker) % 256
+    green = (y * 255 // max(height - 1, 1) + checker) % 256
+    blue = ((x + y) * 255 // max(width + height - 2, 1)) % 256
+    rgb = np.stack([red, green, blue], axis=-1).astype(np.uint8)
+    image = Image.fromarray(rgb, "RGB")
+    if mode == "RGBA":
+        alpha = Image.fromarray((x * 255 // max(width - 1, 1)).astype(np.uint8), "L")
+        image.putalpha(alpha)
+    elif mode == "L":
+        image = image.convert("L")
+    elif mode == "P":
+        # What a palette PNG decodes to
+        image = image.convert("P", palette=Image.ADAPTIVE, colors=64)
+    return image
+
+
+def parse_sizes(raw: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in raw.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def render(image: Image.Image, filter_name: str, filter_value: Optional[str]) -> Image.Image:
+    # thumbnail resizes in place, always work on a copy
+    return run_pipeline(image.copy(), parse_operations(filter_name, filter_value))
+
+
+def time_case(image: Image.Image, filter_name: str, filter_value: Optional[str], repeat: int) -> dict:
+    timings = []
+    output = None
+    for _ in range(repeat):
+        source = image.copy()
+        started = time.perf_counter()
+        output = run_pipeline(source, parse_operations(filter_name, filter_value))
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    render(image, filter_name, filter_value)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "best_ms": round(min(timings) * 1000, 3),
+        "traced_peak_kb": round(peak / 1024, 1),
+        "output_mode": output.mode,
+        "output_bytes": output.width * output.height * len(output.getbands()),
+    }
+
+
+def run_benchmark(sizes: List[Tuple[int, int]], repeat: int, selected: Optional[set]) -> List[dict]:
+    rows = []
+    for width, height in sizes:
+        for mode in MODES:
+            image = make_image(mode, width, height)
+            for name, filter_name, filter_value in CASES:
+                if selected and name not in selected:
+                    continue
+                stats = time_case(image, filter_name, filter_value, repeat)
+                megapixels = width * height / 1e6
+                rows.append({
+                    "filter": name,
+                    "mode": mode,
+                    "size": f"{width}x{height}",
+                    **stats,
+                    "ms_per_megapixel": round(stats["median_ms"] / megapixels, 3),
+                })
+                print(
+                    f"{name:<18}{mode:<6}{width}x{height:<8}"
+                    f"{stats['median_ms']:>10.2f} ms{stats['best_ms']:>10.2f} ms"
+                    f"{stats['traced_peak_kb']:>12.1f} KB",
+                    file=sys.stderr,
+                )
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"WxH list (default {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--filters", default=None, help="comma separated subset, e.g. blur,sepia")
+    parser.add_argument("--output", default=None, help="write the timings as JSON here")
+    args = parser.parse_args()
+
+    selected = set(args.filters.split(",")) if args.filters else None
+    rows = run_benchmark(parse_sizes(args.sizes), args.repeat, selected)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"repeat": args.repeat, "results": rows}, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Per-item cost of the list endpoints (GET /images/ and GET /users/), before
+and after the lean read path.
+
+    python -m benchmarks.list_serialization --rows 10000 --repeat 5
+
+"before" loads each raw document into the mongoengine class, builds the
+response item from the object and serializes it like FastAPI does with a
+response_model (validation, jsonable_encoder, json.dumps). "after" maps the
+projected raw documents straight to dicts and renders them with
+FastJSONResponse. Documents are built in memory as the driver returns
+them, so the database round-trip is not part of the numbers.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.images import Image
+from app.models.user import User
+from app.repositories import image_repository, user_repository
+from app.routes.images import image_summary
+from app.routes.user import user_summary
+from app.schemas.user import UserInDB
+from app.utils.responses import FastJSONResponse, orjson
+
+
+def image_docs(rows: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "user_id": "65a000000000000000000000",
+        "original_filename": f"photo-{i}.jpg",
+        "original_path": f"original/{i:064x}-abcd1234.jpg",
+        "processed_path": f"processed/{i:032x}.jpg",
+        "content_hash": f"{i:064x}",
+        "filter_name": "sepia" if i % 2 else None,
+        "filter_value": None,
+        "transformations": [],
+        "uploaded_at": start + timedelta(seconds=i),
+        "updated_at": start + timedelta(seconds=i),
+    } for i in range(rows)]
+
+
+def user_docs(rows: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "name": f"Name {i}",
+        "last_name": f"Last {i}",
+        "email": f"user{i}@example.com",
+        "password_hash": "$2b$12$" + "x" * 53,
+        "is_active": True,
+        "role": "user",
+        "created_at": start + timedelta(seconds=i),
+        "updated_at": start + timedelta(seconds=i),
+    } for i in range(rows)]
+
+
+def project(docs: List[dict], fields: dict) -> List[dict]:
+    # What the server sends back for the projection
+    if all(value == 0 for value in fields.values()):
+        return [{k: v for k, v in doc.items() if k not in fields} for doc in docs]
+    return [{k: v for k, v in doc.items() if k == "_id" or k in fields} for doc in docs]
+
+
+def images_before(docs: List[dict]) -> bytes:
+    images = [Image._from_son(doc) for doc in docs]
+    content = [
+        {
+            "id": str(img.id),
+            "original_filename": img.original_filename,
+            "original_path": img.original_path,
+            "processed_path": img.processed_path,
+            "filter_name": img.get_filter_name(),
+            "filter_value": img.get_filter_value(),
+            "uploaded_at": img.uploaded_at
+        }
+        for img in images
+    ]
+    content = TypeAdapter(List[dict]).validate_python(content)
+    return json.dumps(jsonable_encoder(content)).encode("utf-8")
+
+
+def images_after(docs: List[dict]) -> bytes:
+    return FastJSONResponse([image_summary(raw) for raw in docs]).body
+
+
+def users_before(docs: List[dict]) -> bytes:
+    users = [User._from_son(doc) for doc in docs]
+    content = [UserInDB(
+        id=str(user.id),
+        name=user.name,
+        last_name=user.last_name,
+        email=user.email,
+        is_active=user.is_active,
+        role=user.role,
+        created_at=user.created_at,
+        updated_at=user.updated_at
+    ) for user in users]
+    content = TypeAdapter(List[UserInDB]).validate_python(content)
+    return json.dumps(jsonable_encoder(content)).encode("utf-8")
+
+
+def users_after(docs: List[dict]) -> bytes:
+    return FastJSONResponse([user_summary(raw) for raw in docs]).body
+
+
+def best_of(fn, docs: List[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    images = image_docs(args.rows)
+    users = user_docs(args.rows)
+    cases = [
+        ("GET /images/", images_before, images, images_after, project(images, image_repository.SUMMARY_FIELDS)),
+        ("GET /users/", users_before, users, users_after, project(users, user_repository.PUBLIC_FIELDS)),
+    ]
+
+    print(f"{args.rows} rows, best of {args.repeat}, orjson {'on' if orjson else 'off'}")
+    print(f"{'endpoint':<14}{'before us/item':>16}{'after us/item':>16}{'speedup':>10}")
+    for name, before, raw_docs, after, projected_docs in cases:
+        t_before = best_of(before, raw_docs, args.repeat)
+        t_after = best_of(after, projected_docs, args.repeat)
+        us_before = t_before / args.rows * 1e6
+        us_after = t_after / args.rows * 1e6
+        print(f"{name:<14}{us_before:>16.2f}{us_after:>16.2f}{t_before / t_after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+End-to-end load test of the images API.
+
+    python -m benchmarks.load_test --requests 2000 --concurrency 16 --output run.json
+    python -m benchmarks.load_test --baseline run.json   # exit code 1 on a regression
+
+Boots the app in this process against a MongoDB stand-in (mongomock, or a
+real server with --mongo-uri) and local storage in a temporary folder.
+Every virtual user registers, uploads a few images from a synthetic
+corpus of varied sizes and formats, and then sends a weighted mix of
+upload, process, file and original gallery requests, with a fixed number
+of users in flight. The report is JSON: throughput, p50/p95/p99 latency
+and errors per operation, plus peak RSS.
+
+The mongomock stand-in is slower than a real server and adds its own
+cost to every request, compare runs made with the same setup. Needs the
+packages in benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+DEFAULT_MIX = "upload=1,process=2,file=6,original=1"
+FILTERS = [
+    {"filter_name": "grayscale"},
+    {"filter_name": "sepia"},
+    {"filter_name": "invert"},
+    {"filter_name": "brightness", "filter_value": "1.3"},
+    {"filter_name": "blur", "filter_value": "2"},
+    {"operations": [{"name": "sepia"}, {"name": "brightness", "value": "1.2"}]},
+]
+# (width, height) of the corpus, each in JPEG and PNG
+CORPUS_SIZES = [(320, 240), (800, 600), (1280, 960), (1920, 1080)]
+
+
+def build_corpus(seed: int) -> List[tuple]:
+    """Synthetic photos: gradients plus noise, so they compress like real ones."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for width, height in CORPUS_SIZES:
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+        noise = rng.normal(0, 18, (height, width, 3))
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels, "RGB")
+        for fmt, ext, mime, options in (("JPEG", "jpg", "image/jpeg", {"quality": 85}), ("PNG", "png", "image/png", {})):
+            buffer = io.BytesIO()
+            image.save(buffer, fmt, **options)
+            corpus.append((f"{width}x{height}.{ext}", buffer.getvalue(), mime))
+    return corpus
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, weight = item.split("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"upload", "process", "file", "original"}
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def prepare_environment(args) -> None:
+    # Before anything from app is imported, app.config reads these once
+    workdir = tempfile.mkdtemp(prefix="imgbest-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("FRONTEND_URL", "http://localhost")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["PROCESSING_MAX_WORKERS"] = str(args.workers)
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["MONGO_DB"] = f"bench_{os.getpid()}"
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+
+
+def use_mongo_stand_in() -> None:
+    import mongoengine
+    import mongomock
+    from mongomock_motor import AsyncMongoMockClient
+
+    import app.db.async_db as async_db
+    import app.db.init_db as init_db
+
+    def connect(*args, **kwargs):
+        kwargs["mongo_client_class"] = mongomock.MongoClient
+        return mongoengine.connect(*args, **kwargs)
+
+    init_db.connect = connect
+    # Both drivers see the same in-memory data
+    init_db.connect_async_db = lambda: async_db.connect_async_db(
+        AsyncMongoMockClient(mock_mongo_client=mongoengine.connection.get_connection())
+    )
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    # Of this process, app and client. Processing pool workers are not
+    # included, run with --workers -1 to keep the filters in process
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1 / 1024 / 1024 if sys.platform == "darwin" else 1 / 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1)
+
+
+class VirtualUser:
+    def __init__(self, client, index: int, corpus: List[tuple], rng: random.Random):
+        self.client = client
+        self.email = f"bench{index}@example.com"
+        self.corpus = corpus
+        self.rng = rng
+        self.image_ids: List[str] = []
+
+    async def login(self) -> None:
+        await self.client.post("/auth/register", json={
+            "name": "Bench", "last_name": "User", "email": self.email, "password": "benchmark"
+        })
+        response = await self.client.post("/auth/login", json={"email": self.email, "password": "benchmark"})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['user']['token']}"}
+
+    async def upload(self):
+        name, data, mime = self.rng.choice(self.corpus)
+        response = await self.client.post("/images/upload", files={"file": (name, data, mime)}, headers=self.headers)
+        if response.status_code == 201:
+            self.image_ids.append(response.json()["image_id"])
+        return response
+
+    async def process(self):
+        image_id = self.rng.choice(self.image_ids)
+        return await self.client.post(f"/images/{image_id}/process", json=self.rng.choice(FILTERS), headers=self.headers)
+
+    async def file(self):
+        image_id = self.rng.choice(self.image_ids)
+        return await self.client.get(f"/images/{image_id}/file", headers=self.headers)
+
+    async def original(self):
+        return await self.client.get("/images/original", params={"limit": 20}, headers=self.headers)
+
+
+async def run_load(args, corpus: List[tuple]) -> dict:
+    import httpx
+    from app.main import app
+
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    results: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    mix = parse_mix(args.mix)
+    operations, weights = list(mix), list(mix.values())
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            users = [VirtualUser(client, i, corpus, random.Random(args.seed + i)) for i in range(args.concurrency)]
+            # Not measured: accounts and a few images to work on
+            for user in users:
+                await user.login()
+                for _ in range(args.seed_images):
+                    await user.upload()
+
+            remaining = args.requests
+            deadline = time.perf_counter() + args.duration if args.duration else None
+
+            async def drive(user: VirtualUser):
+                nonlocal remaining
+                while True:
+                    if deadline is not None:
+                        if time.perf_counter() >= deadline:
+                            return
+                    elif remaining <= 0:
+                        return
+                    else:
+                        remaining -= 1
+                    operation = user.rng.choices(operations, weights)[0]
+                    started = time.perf_counter()
+                    response = await getattr(user, operation)()
+                    elapsed = time.perf_counter() - started
+                    results.setdefault(operation, []).append(elapsed)
+                    if response.status_code >= 400:
+                        errors[operation] = errors.get(operation, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(drive(user) for user in users))
+            wall = time.perf_counter() - started
+    finally:
+        await app.router.shutdown()
+
+    report = {}
+    for operation, latencies in sorted(results.items()):
+        latencies.sort()
+        report[operation] = {
+            "count": len(latencies),
+            "errors": errors.get(operation, 0),
+            "throughput_rps": round(len(latencies) / wall, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    total = sum(len(latencies) for latencies in results.values())
+    return {
+        "wall_seconds": round(wall, 2),
+        "total": {"count": total, "errors": sum(errors.values()), "throughput_rps": round(total / wall, 2)},
+        "operations": report,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Operations whose p95 grew, or throughput fell, by more than threshold."""
+    regressions = []
+    for operation, stats in current["operations"].items():
+        before = baseline.get("operations", {}).get(operation)
+        if not before:
+            continue
+        if before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{operation}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+        if before["throughput_rps"] and stats["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{operation}: throughput {before['throughput_rps']} -> {stats['throughput_rps']} req/s")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests in total")
+    parser.add_argument("--duration", type=float, default=None, help="run for this many seconds instead")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users in flight")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed-images", type=int, default=3, help="images uploaded by each user before measuring")
+    parser.add_argument("--workers", type=int, default=0, help="PROCESSING_MAX_WORKERS of the app (-1 runs filters in a thread)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", default=None, help="real MongoDB instead of the mongomock stand-in")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative change (default 0.15)")
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    prepare_environment(args)
+    if not args.mongo_uri:
+        use_mongo_stand_in()
+    corpus = build_corpus(args.seed)
+
+    report = {
+        "config": {
+            "requests": None if args.duration else args.requests,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "seed_images": args.seed_images,
+            "workers": args.workers,
+            "mongo": "server" if args.mongo_uri else "mongomock",
+            "corpus": [name for name, _, _ in corpus],
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **asyncio.run(run_load(args, corpus)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    status = 0
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# app.config reads the environment once, on first import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("FRONTEND_URL", "http://localhost")
+os.environ.setdefault("LOG_FORMAT", "text")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="imgbest-test-logs-"))
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import mongoengine
+import mongomock
+import pytest
+
+from app.models.batch import BatchJob, BatchItem, BATCH_COMPLETED, BATCH_RUNNING
+from app.services import batch
+from app.services.executor import ExecutorSaturated
+
+STALE_SECONDS = 0.3
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    mongoengine.connect("batch_test", mongo_client_class=mongomock.MongoClient, uuidRepresentation="standard")
+    monkeypatch.setattr(batch, "BATCH_STALE_SECONDS", STALE_SECONDS)
+    monkeypatch.setattr(batch, "SATURATED_RETRY_SECONDS", 0.02)
+    yield
+    mongoengine.disconnect()
+
+
+def make_job(**fields) -> BatchJob:
+    job = BatchJob(user_id="u1", filter_name="sepia", total=1, items=[BatchItem(image_id="i1")], **fields)
+    job.save()
+    return job
+
+
+def test_saturated_job_is_claimed_once(monkeypatch):
+    claims = []
+    renders = []
+    claim = batch.claim_batch_job
+
+    def counting_claim(job_id):
+        job = claim(job_id)
+        if job is not None:
+            claims.append(job_id)
+        return job
+
+    async def get_image(image_id):
+        return SimpleNamespace(user_id="u1")
+
+    started = time.monotonic()
+
+    async def render(image, filter_name, filter_value):
+        # The executor stays full for several stale windows
+        if time.monotonic() - started < STALE_SECONDS * 4:
+            raise ExecutorSaturated("full")
+        renders.append(filter_name)
+        return False
+
+    monkeypatch.setattr(batch, "claim_batch_job", counting_claim)
+    monkeypatch.setattr(batch.image_repository, "get", get_image)
+    monkeypatch.setattr(batch, "render_image", render)
+
+    async def scenario():
+        job = make_job()
+        watcher = asyncio.create_task(batch.watch_batch_jobs())
+        while BatchJob.objects(id=job.id).first().status != BATCH_COMPLETED:
+            await asyncio.sleep(0.05)
+        watcher.cancel()
+        return job.reload()
+
+    job = asyncio.run(scenario())
+    assert len(claims) == 1
+    assert renders == ["sepia"]
+    assert job.completed == 1 and job.failed == 0
+
+
+def test_jobs_of_an_instance_that_went_quiet_are_claimed():
+    job = make_job(status=BATCH_RUNNING, owner="other", heartbeat_at=datetime.now() - timedelta(seconds=1))
+    assert batch.resumable_batch_job_ids() == [job.id]
+    assert batch.claim_batch_job(job.id).owner == batch.INSTANCE_ID
+    # Now ours, the watcher leaves it alone even when it looks stale
+    BatchJob.objects(id=job.id).update_one(set__heartbeat_at=datetime.now() - timedelta(seconds=1))
+    assert batch.resumable_batch_job_ids() == []
+    assert batch.claim_batch_job(job.id) is None
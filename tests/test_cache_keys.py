@@ -0,0 +1,18 @@
+from app.services import encoding
+from app.services.derivative_cache import DerivativeCache
+from app.utils.http_cache import make_etag
+
+
+def test_rendered_keys_change_with_the_encoder_settings(monkeypatch):
+    variant = DerivativeCache.make_key("hash", None, None, "webp", width=320)
+    filtered = DerivativeCache.make_key("hash", "sepia", None, "webp")
+    original = DerivativeCache.make_key("hash", None, None, "webp")
+    etag = make_etag("hash", "variant-320.webp", encoding.encoder_signature("webp"))
+
+    monkeypatch.setattr(encoding, "WEBP_QUALITY", 50)
+
+    assert DerivativeCache.make_key("hash", None, None, "webp", width=320) != variant
+    assert DerivativeCache.make_key("hash", "sepia", None, "webp") != filtered
+    assert make_etag("hash", "variant-320.webp", encoding.encoder_signature("webp")) != etag
+    # The uploaded bytes do not depend on the encoder
+    assert DerivativeCache.make_key("hash", None, None, "webp") == original
@@ -0,0 +1,77 @@
+import os
+
+from app.services.derivative_cache import DerivativeCache
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_get_into_copies_a_hit(tmp_path):
+    cache = DerivativeCache(str(tmp_path / "cache"), max_bytes=1024)
+    write(tmp_path / "a.png", b"rendered")
+    cache.put("k", "png", str(tmp_path / "a.png"))
+
+    dest = tmp_path / "out.png"
+    assert cache.get_into("k", "png", str(dest))
+    assert dest.read_bytes() == b"rendered"
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_into_misses_when_another_process_evicted_the_file(tmp_path):
+    cache = DerivativeCache(str(tmp_path / "cache"), max_bytes=1024)
+    write(tmp_path / "a.png", b"rendered")
+    cache.put("k", "png", str(tmp_path / "a.png"))
+    os.remove(tmp_path / "cache" / "k.png")
+
+    assert not cache.get_into("k", "png", str(tmp_path / "out.png"))
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["entries"] == 0 and stats["size_bytes"] == 0
+
+
+def test_get_into_misses_after_eviction(tmp_path):
+    cache = DerivativeCache(str(tmp_path / "cache"), max_bytes=10)
+    for key in ("old", "new"):
+        write(tmp_path / "a.png", b"12345678")
+        cache.put(key, "png", str(tmp_path / "a.png"))
+
+    assert not cache.get_into("old", "png", str(tmp_path / "out.png"))
+    assert cache.get_into("new", "png", str(tmp_path / "out.png"))
+
+
+def test_pinned_path_outlives_the_eviction(tmp_path):
+    cache = DerivativeCache(str(tmp_path / "cache"), max_bytes=10)
+    write(tmp_path / "a.png", b"12345678")
+    cache.put("old", "png", str(tmp_path / "a.png"))
+    pinned = cache.pin("old", "png")
+
+    write(tmp_path / "b.png", b"abcdefgh")
+    cache.put("new", "png", str(tmp_path / "b.png"))
+    assert cache.pin("old", "png") is None
+    with open(pinned, "rb") as f:
+        assert f.read() == b"12345678"
+
+
+def test_expired_pins_are_removed(tmp_path):
+    cache = DerivativeCache(str(tmp_path / "cache"), max_bytes=1024, pin_seconds=-1, rescan_seconds=0)
+    write(tmp_path / "a.png", b"data")
+    pinned = cache.put("a", "png", str(tmp_path / "a.png"))
+    write(tmp_path / "b.png", b"data")
+    cache.put("b", "png", str(tmp_path / "b.png"))
+    assert not os.path.exists(pinned)
+
+
+def test_workers_sharing_the_directory_share_the_budget(tmp_path):
+    first = DerivativeCache(str(tmp_path / "cache"), max_bytes=20, rescan_seconds=0)
+    second = DerivativeCache(str(tmp_path / "cache"), max_bytes=20, rescan_seconds=0)
+    for n in range(3):
+        write(tmp_path / "a.png", b"12345678")
+        first.put(f"first{n}", "png", str(tmp_path / "a.png"))
+        write(tmp_path / "a.png", b"12345678")
+        second.put(f"second{n}", "png", str(tmp_path / "a.png"))
+
+    # Each one sees what the other wrote, and the directory stays in budget
+    assert first.pin("second2", "png") is not None
+    on_disk = [e for e in os.scandir(tmp_path / "cache") if e.is_file() and not e.name.startswith(".")]
+    assert sum(e.stat().st_size for e in on_disk) <= 20
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services.executor import ExecutorSaturated, ProcessingExecutor, WorkerCrashed
+
+
+def crash():
+    os._exit(1)
+
+
+def square(value):
+    return value * value
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def make_executor(workers=1, queue_size=1, task_timeout=10):
+    return ProcessingExecutor(workers=workers, queue_size=queue_size, task_timeout=task_timeout, max_tasks_per_child=0)
+
+
+def test_dead_worker_rebuilds_the_pool():
+    executor = make_executor()
+
+    async def scenario():
+        with pytest.raises(WorkerCrashed):
+            await executor.submit(crash)
+        # The next task gets a new pool instead of BrokenProcessPool
+        return await executor.submit(square, 7)
+
+    try:
+        assert asyncio.run(scenario()) == 49
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.parametrize("workers", [1, -1])
+def test_timed_out_task_keeps_its_slot_until_it_ends(workers):
+    executor = make_executor(workers=workers, queue_size=0, task_timeout=0.2)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.submit(sleep, 1)
+        # Still running in the pool
+        assert executor.pending == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.submit(square, 2)
+        await asyncio.sleep(1.5)
+        assert executor.pending == 0
+        return await executor.submit(square, 3)
+
+    try:
+        assert asyncio.run(scenario()) == 9
+    finally:
+        executor.shutdown()
+
+
+def test_pillow_time_excludes_the_queue_wait():
+    from app.utils.metrics import RequestStats, request_stats_var
+
+    executor = make_executor(workers=1, queue_size=1)
+
+    async def request():
+        # Each task has its own context, like each request
+        stats = RequestStats()
+        request_stats_var.set(stats)
+        started = time.perf_counter()
+        await executor.submit(sleep, 0.3)
+        return stats.pillow_seconds, time.perf_counter() - started
+
+    async def scenario():
+        # Warm up the worker, spawning it is not part of either task
+        await executor.submit(square, 1)
+        return await asyncio.gather(request(), request())
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    # One worker: the second task waited for the first one
+    waited = max(elapsed for _, elapsed in results)
+    assert waited >= 0.6
+    for pillow_seconds, _ in results:
+        assert 0.3 <= pillow_seconds < 0.5
@@ -0,0 +1,46 @@
+"""
+Golden outputs of the image filters, rendered from the test card of
+benchmarks/filters.py. After an intended change rewrite them with
+
+    python -m tests.test_filters
+"""
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmarks.filters import CASES, MODES, make_image, render
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_SIZE = (64, 48)
+# Point filters must match exactly; these resample, and may differ by one
+# level between Pillow versions
+ALLOWED_DIFFERENCE = {"blur": 1, "thumbnail": 1}
+
+
+def golden_path(name: str, mode: str) -> str:
+    return os.path.join(GOLDEN_DIR, f"{name.replace('+', '_')}_{mode.lower()}.png")
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("name,filter_name,filter_value", CASES)
+def test_filter_matches_the_golden_output(name, filter_name, filter_value, mode):
+    actual = render(make_image(mode, *GOLDEN_SIZE), filter_name, filter_value)
+    with Image.open(golden_path(name, mode)) as expected:
+        expected.load()
+    assert (actual.mode, actual.size) == (expected.mode, expected.size)
+    difference = np.abs(np.asarray(expected, dtype=np.int16) - np.asarray(actual, dtype=np.int16))
+    assert int(difference.max()) <= ALLOWED_DIFFERENCE.get(name, 0)
+
+
+def update_golden() -> None:
+    for mode in MODES:
+        image = make_image(mode, *GOLDEN_SIZE)
+        for name, filter_name, filter_value in CASES:
+            render(image, filter_name, filter_value).save(golden_path(name, mode), "PNG")
+    print(f"Golden outputs written to {GOLDEN_DIR}")
+
+
+if __name__ == "__main__":
+    update_golden()
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.conftest import ROOT
+
+
+@pytest.mark.parametrize("module", ["app.worker", "app.migrate", "app.services.executor", "app.main"])
+def test_entrypoint_imports_on_its_own(module):
+    # A fresh interpreter, so nothing imported by other tests hides a cycle
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import mongoengine
+import mongomock
+import pytest
+
+from app.models.job import Job, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from app.services import job_queue
+
+KIND = "test_job"
+
+
+@pytest.fixture(autouse=True)
+def db():
+    mongoengine.connect("jobs_test", mongo_client_class=mongomock.MongoClient, uuidRepresentation="standard")
+    calls = {"runs": [], "gave_up": []}
+
+    async def run(job):
+        calls["runs"].append(job.worker_id)
+        if job.payload.get("fail"):
+            raise RuntimeError("boom")
+        return {"ok": True}
+
+    job_queue.register_handler(KIND, run, lambda job, error: calls["gave_up"].append((job.id, error)))
+    yield calls
+    job_queue._handlers.pop(KIND, None)
+    mongoengine.disconnect()
+
+
+def expire_lease(job):
+    Job.objects(id=job.id).update_one(set__lease_until=datetime.now() - timedelta(seconds=1))
+
+
+def test_claim_takes_due_jobs_once():
+    job_queue.enqueue(KIND, {"n": 1})
+    job_queue.enqueue(KIND, {"n": 2}, delay=60)
+
+    job = job_queue.claim("w1")
+    assert job.payload == {"n": 1}
+    assert job.status == JOB_RUNNING and job.attempts == 1 and job.worker_id == "w1"
+    # The other one is not due yet
+    assert job_queue.claim("w2") is None
+
+
+def test_expired_lease_is_claimed_by_another_worker():
+    job_queue.enqueue(KIND, {})
+    first = job_queue.claim("w1")
+    assert job_queue.claim("w2") is None
+
+    expire_lease(first)
+    second = job_queue.claim("w2")
+    assert second.id == first.id and second.attempts == 2
+    # The first worker lost it and cannot report on it anymore
+    assert not job_queue.extend_lease(first)
+    job_queue.complete(first, {"stale": True})
+    assert Job.objects.get(id=first.id).status == JOB_RUNNING
+    assert job_queue.extend_lease(second)
+
+
+def test_failure_is_retried_with_backoff(db):
+    job_queue.enqueue(KIND, {"fail": True}, max_attempts=3)
+    job = job_queue.claim("w1")
+    asyncio.run(job_queue.run_job(job))
+
+    stored = Job.objects.get(id=job.id)
+    assert stored.status == JOB_QUEUED and stored.last_error == "boom"
+    assert stored.run_at > datetime.now()
+    assert job_queue.claim("w1") is None
+
+    Job.objects(id=job.id).update_one(set__run_at=datetime.now())
+    assert job_queue.claim("w1").attempts == 2
+    assert db["gave_up"] == []
+
+
+def test_retry_delay_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(job_queue.random, "uniform", lambda a, b: 1.0)
+    delays = [job_queue.retry_delay(n) for n in range(1, 20)]
+    assert delays == sorted(delays)
+    assert delays[1] == 2 * delays[0]
+    assert delays[-1] == job_queue.JOB_RETRY_MAX_SECONDS
+
+
+def test_gives_up_after_the_last_attempt(db):
+    job_queue.enqueue(KIND, {"fail": True}, max_attempts=1)
+    job = job_queue.claim("w1")
+    asyncio.run(job_queue.run_job(job))
+
+    assert Job.objects.get(id=job.id).status == JOB_FAILED
+    assert db["gave_up"] == [(job.id, "boom")]
+
+
+def test_job_whose_worker_keeps_dying_gives_up(db):
+    job_queue.enqueue(KIND, {}, max_attempts=2)
+    for attempt in (1, 2):
+        job = job_queue.claim("w1")
+        assert job.attempts == attempt
+        expire_lease(job)
+    # No attempts left, not claimed a third time
+    assert job_queue.claim("w1") is None
+
+    assert asyncio.run(job_queue.give_up_expired()) == 1
+    stored = Job.objects.get(id=job.id)
+    assert stored.status == JOB_FAILED and "Lease expired" in stored.last_error
+    assert db["gave_up"] == [(job.id, stored.last_error)]
+
+
+def test_successful_job_is_completed(db):
+    job_queue.enqueue(KIND, {})
+    job = job_queue.claim("w1")
+    asyncio.run(job_queue.run_job(job))
+    stored = Job.objects.get(id=job.id)
+    assert stored.status == JOB_DONE and stored.result == {"ok": True}
+    assert db["runs"] == ["w1"]
@@ -0,0 +1,48 @@
+import asyncio
+
+from bson import Int64
+from pymongo import monitoring
+
+from app.db.async_db import pool_options
+from app.utils.metrics import RequestStats, mongo_command_counter, mongo_operations, request_stats_var
+
+
+def started(command):
+    # The command name is the first key
+    return monitoring.CommandStartedEvent(command, "test", 1, ("localhost", 27017), 1)
+
+
+def count(collection, operation):
+    return mongo_operations.labels(collection, operation)._value.get()
+
+
+def test_both_drivers_get_the_listener():
+    # The mongoengine connection and the Motor client are built from pool_options
+    assert mongo_command_counter in pool_options()["event_listeners"]
+
+
+def test_counts_collection_commands_per_request():
+    async def request():
+        stats = RequestStats()
+        request_stats_var.set(stats)
+        mongo_command_counter.started(started({"find": "images", "filter": {}}))
+        # mongoengine queries run in a thread, with a copy of the context
+        await asyncio.to_thread(mongo_command_counter.started, started({"update": "batch_jobs"}))
+        mongo_command_counter.started(started({"getMore": Int64(7), "collection": "images"}))
+        return stats.mongo_ops
+
+    before = count("images", "find"), count("batch_jobs", "update"), count("images", "getMore")
+    assert asyncio.run(request()) == 3
+    after = count("images", "find"), count("batch_jobs", "update"), count("images", "getMore")
+    assert [b - a for a, b in zip(before, after)] == [1, 1, 1]
+
+
+def test_skips_commands_without_a_collection():
+    async def request():
+        stats = RequestStats()
+        request_stats_var.set(stats)
+        for name in ("ping", "endSessions", "saslStart"):
+            mongo_command_counter.started(started({name: 1}))
+        return stats.mongo_ops
+
+    assert asyncio.run(request()) == 0
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from app.config import MONGO_DB
+from app.db import async_db
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.images import Image
+from app.models.user import User
+
+USER = User(id=ObjectId(), name="a", last_name="b", email="a@b.com", password_hash="x")
+
+
+@pytest.fixture
+def gallery(monkeypatch):
+    """Ids of the user's images in ascending (uploaded_at, _id) order."""
+    mongo = mongomock.MongoClient()
+    monkeypatch.setattr(async_db, "_client", AsyncMongoMockClient(mock_mongo_client=mongo))
+    app.dependency_overrides[get_current_user] = lambda: USER
+
+    # Two legacy documents saved before uploaded_at existed sort first
+    docs = [{"_id": ObjectId()} for _ in range(2)]
+    docs += [{"_id": ObjectId(), "uploaded_at": datetime(2024, 1, 1) + timedelta(days=n)} for n in range(3)]
+    for doc in docs:
+        doc.update(user_id=str(USER.id), original_filename="a.png", original_path="original/a.png", processed_path="processed/a.png")
+    mongo[MONGO_DB][Image._get_collection_name()].insert_many(docs)
+    yield [str(doc["_id"]) for doc in docs]
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def list_pages(path: str, sort: str, ids_of, next_cursor_of) -> list:
+    client = TestClient(app)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "sort": sort, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        seen += ids_of(response.json())
+        cursor = next_cursor_of(response)
+        if not cursor:
+            return seen
+
+
+@pytest.mark.parametrize("sort", ["uploaded_at", "-uploaded_at"])
+def test_listing_pages_through_images_without_uploaded_at(gallery, sort):
+    seen = list_pages(
+        "/images/", sort,
+        lambda body: [image["id"] for image in body],
+        lambda response: response.headers.get("X-Next-Cursor"),
+    )
+    assert seen == (gallery if sort == "uploaded_at" else gallery[::-1])
+
+
+@pytest.mark.parametrize("sort", ["uploaded_at", "-uploaded_at"])
+def test_manifest_pages_through_images_without_uploaded_at(gallery, sort):
+    seen = list_pages(
+        "/images/manifest", sort,
+        lambda body: [image["id"] for image in body["images"]],
+        lambda response: response.json()["next_cursor"],
+    )
+    assert seen == (gallery if sort == "uploaded_at" else gallery[::-1])
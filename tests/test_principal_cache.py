@@ -0,0 +1,50 @@
+import asyncio
+
+import fakeredis
+from bson import ObjectId
+
+from app.models.user import User
+from app.services.principal_cache import MemoryBackend, PrincipalCache, RedisBackend
+
+
+def make_user():
+    return User(id=ObjectId(), name="a", last_name="b", email="a@b.com", password_hash="x")
+
+
+def redis_cache(server):
+    client = fakeredis.aioredis.FakeRedis(server=server)
+    return PrincipalCache(RedisBackend("redis://unused", 60, client=client), 100, 60)
+
+
+def test_memory_backend_invalidation():
+    async def scenario():
+        cache = PrincipalCache(MemoryBackend(100, 60), 100, 60)
+        user = make_user()
+        await cache.put_user(user, await cache.generation())
+        assert (await cache.get_user(str(user.pk))).email == "a@b.com"
+        await cache.invalidate_user(str(user.pk))
+        return await cache.get_user(str(user.pk))
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_invalidation_in_one_worker_reaches_the_others():
+    # Two workers sharing one Redis
+    async def scenario():
+        server = fakeredis.FakeServer()
+        first, second = redis_cache(server), redis_cache(server)
+        user = make_user()
+        await first.put_user(user, await first.generation())
+        assert await second.get_user(str(user.pk)) is not None
+
+        await first.invalidate_user(str(user.pk))
+        assert await second.get_user(str(user.pk)) is None
+
+        # The second worker loaded the user before the invalidation of the
+        # first one, its stale copy is not cached
+        generation = await second.generation()
+        await first.invalidate_user(str(user.pk))
+        await second.put_user(user, generation)
+        return await first.get_user(str(user.pk))
+
+    assert asyncio.run(scenario()) is None
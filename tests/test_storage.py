@@ -0,0 +1,86 @@
+import io
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.storage import BlobNotFound, LocalStorage, MemoryStorage
+from app.storage.base import CHUNK_SIZE
+from app.storage.s3 import S3Storage
+
+BUCKET = "images-test"
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield S3Storage(BUCKET, prefix="app/", client=client)
+
+
+@pytest.fixture(params=["memory", "local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    if request.param == "local":
+        return LocalStorage(str(tmp_path / "storage"))
+    return request.getfixturevalue("s3_storage")
+
+
+def test_round_trip(storage):
+    assert storage.put("original/a.png", b"png bytes") == 9
+    assert storage.exists("original/a.png")
+    assert storage.get("original/a.png") == b"png bytes"
+    assert storage.size("original/a.png") == 9
+
+    assert storage.delete("original/a.png")
+    assert not storage.exists("original/a.png")
+    assert not storage.delete("original/a.png")
+
+
+def test_missing_blob(storage):
+    assert not storage.exists("original/missing.png")
+    with pytest.raises(BlobNotFound):
+        storage.get("original/missing.png")
+    with pytest.raises(BlobNotFound):
+        storage.size("original/missing.png")
+    with pytest.raises(FileNotFoundError):
+        b"".join(storage.stream("original/missing.png"))
+
+
+def test_put_replaces_and_reads_file_objects(storage):
+    storage.put("processed/a.png", b"old")
+    assert storage.put("processed/a.png", io.BytesIO(b"new contents")) == 12
+    assert storage.get("processed/a.png") == b"new contents"
+
+
+def test_stream_and_ranges(storage):
+    data = bytes(range(256)) * (CHUNK_SIZE // 128)
+    storage.put("original/big.bin", data)
+
+    assert b"".join(storage.stream("original/big.bin")) == data
+    assert b"".join(storage.stream("original/big.bin", 10, 19)) == data[10:20]
+    assert b"".join(storage.stream("original/big.bin", CHUNK_SIZE - 5)) == data[CHUNK_SIZE - 5:]
+
+
+def test_put_file_moves_the_file(storage, tmp_path):
+    source = tmp_path / "upload.png"
+    source.write_bytes(b"uploaded")
+    assert storage.put_file("original/b.png", str(source)) == 8
+    assert not source.exists()
+    assert storage.get("original/b.png") == b"uploaded"
+
+
+@pytest.mark.parametrize("key", ["", "/etc/passwd", "../a.png", "original/../../a.png", "original//a.png"])
+def test_rejects_keys_outside_the_storage(storage, key):
+    with pytest.raises(ValueError):
+        storage.put(key, b"x")
+
+
+def test_s3_keys_use_the_prefix(s3_storage):
+    s3_storage.put("original/a.png", b"x")
+    listed = s3_storage.client.list_objects_v2(Bucket=BUCKET)["Contents"]
+    assert [o["Key"] for o in listed] == ["app/original/a.png"]
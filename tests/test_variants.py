@@ -0,0 +1,25 @@
+import asyncio
+
+from app.services import variants
+from app.services.executor import processing_executor
+
+
+def test_pregeneration_is_skipped_when_the_executor_is_busy(monkeypatch, tmp_path):
+    rendered = []
+
+    async def local_file(key, cache_key):
+        return str(tmp_path / "original.png")
+
+    async def get_variant(file_path, content_hash, filter_name, filter_value, width, fmt):
+        rendered.append(width)
+
+    monkeypatch.setattr("app.services.storage.local_file", local_file)
+    monkeypatch.setattr(variants, "get_variant", get_variant)
+
+    monkeypatch.setattr(processing_executor, "_pending", processing_executor.capacity)
+    asyncio.run(variants.pregenerate_variants("original/a.png", "hash"))
+    assert rendered == []
+
+    monkeypatch.setattr(processing_executor, "_pending", 0)
+    asyncio.run(variants.pregenerate_variants("original/a.png", "hash"))
+    assert rendered == variants.VARIANT_WIDTHS